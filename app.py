@@ -2,13 +2,21 @@ import streamlit as st
 import os
 import re
 import subprocess
-import base64
 import shutil
-import json
-import bcrypt
+import atexit
+import base64
+import glob
+import hashlib
+import html
+import io
+import tempfile
+import threading
+import time
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List
+from types import MappingProxyType
 
 # Import block system for visual editor
 from block_system import (
@@ -17,6 +25,10 @@ from block_system import (
     get_default_block_content, get_block_icon, get_block_name,
     estimate_block_height, SECTION_PALETTES
 )
+# Users, login throttling and the activity log
+from auth import AuthManager, AuditLogger, LoginThrottled
+# Legacy editor block split and build log parsing
+from latex_utils import parse_latex_blocks as _parse_latex_blocks, reconstruct_latex, parse_latex_log
 
 # ==========================================
 # 1. CONFIGURATION & THEME
@@ -28,151 +40,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# ==========================================
-# 2. AUTHENTICATION & AUDIT MODULE
-# ==========================================
-class AuthManager:
-    """Handles user authentication and management"""
-
-    def __init__(self, auth_dir: str):
-        self.auth_dir = Path(auth_dir)
-        self.users_file = self.auth_dir / "users.json"
-        self._ensure_auth_dir()
-
-    def _ensure_auth_dir(self):
-        """Create auth directory and bootstrap admin user if needed"""
-        self.auth_dir.mkdir(exist_ok=True)
-
-        if not self.users_file.exists():
-            # Bootstrap initial admin
-            initial_data = {
-                "version": "1.0",
-                "users": {
-                    "admin": {
-                        "username": "admin",
-                        "password_hash": self._hash_password("admin123"),
-                        "role": "admin",
-                        "created_at": datetime.utcnow().isoformat() + "Z",
-                        "created_by": "system",
-                        "last_login": None,
-                        "is_active": True
-                    }
-                }
-            }
-            self._save_users(initial_data)
-
-    def _hash_password(self, password: str) -> str:
-        """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'),
-                            bcrypt.gensalt(rounds=12)).decode('utf-8')
-
-    def _verify_password(self, password: str, password_hash: str) -> bool:
-        """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'),
-                             password_hash.encode('utf-8'))
-
-    def _load_users(self) -> Dict:
-        """Load users from JSON file"""
-        with open(self.users_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-
-    def _save_users(self, data: Dict):
-        """Save users to JSON file"""
-        with open(self.users_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-
-    def authenticate(self, username: str, password: str) -> Optional[Dict]:
-        """Authenticate user and return user data if successful"""
-        users_data = self._load_users()
-        user = users_data["users"].get(username)
-
-        if user and user["is_active"] and self._verify_password(password, user["password_hash"]):
-            # Update last login
-            user["last_login"] = datetime.utcnow().isoformat() + "Z"
-            users_data["users"][username] = user
-            self._save_users(users_data)
-            return user
-        return None
-
-    def create_user(self, username: str, password: str, role: str,
-                   created_by: str) -> tuple:
-        """Create new user (admin only)"""
-        users_data = self._load_users()
-
-        if username in users_data["users"]:
-            return False, "Username already exists"
-
-        if role not in ["admin", "user"]:
-            return False, "Invalid role"
-
-        users_data["users"][username] = {
-            "username": username,
-            "password_hash": self._hash_password(password),
-            "role": role,
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "created_by": created_by,
-            "last_login": None,
-            "is_active": True
-        }
-        self._save_users(users_data)
-        return True, "User created successfully"
-
-    def get_all_users(self) -> List[Dict]:
-        """Get list of all users (for admin panel)"""
-        users_data = self._load_users()
-        return list(users_data["users"].values())
-
-    def update_user_status(self, username: str, is_active: bool) -> tuple:
-        """Enable/disable user account"""
-        users_data = self._load_users()
-        if username not in users_data["users"]:
-            return False, "User not found"
-
-        users_data["users"][username]["is_active"] = is_active
-        self._save_users(users_data)
-        return True, f"User {'activated' if is_active else 'deactivated'}"
-
-    def change_password(self, username: str, new_password: str) -> tuple:
-        """Change user password"""
-        users_data = self._load_users()
-        if username not in users_data["users"]:
-            return False, "User not found"
-
-        users_data["users"][username]["password_hash"] = self._hash_password(new_password)
-        self._save_users(users_data)
-        return True, "Password changed successfully"
-
-
-class AuditLogger:
-    """Handles activity logging"""
-
-    def __init__(self, auth_dir: str):
-        self.log_file = Path(auth_dir) / "audit_log.jsonl"
-
-    def log(self, username: str, action: str, details: Dict = None):
-        """Append log entry"""
-        entry = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "username": username,
-            "action": action,
-            "details": details or {}
-        }
-
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
-
-    def get_recent_logs(self, limit: int = 100) -> List[Dict]:
-        """Get recent log entries (for admin panel)"""
-        if not self.log_file.exists():
-            return []
-
-        with open(self.log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        # Get last N lines
-        recent_lines = lines[-limit:] if len(lines) > limit else lines
-        return [json.loads(line) for line in recent_lines if line.strip()]
-
 # Initialize Session State for Language
 if 'language' not in st.session_state:
     st.session_state['language'] = 'English'
@@ -189,15 +56,14 @@ if 'preview_generated_at' not in st.session_state:
 
 # Define Language-Specific Logic
 is_arabic = st.session_state['language'] == 'Arabic'
-text_direction = "rtl" if is_arabic else "ltr"
-font_family = "'Amiri', 'Arial', sans-serif" if is_arabic else "'Source Sans Pro', sans-serif"
-editor_align = "right" if is_arabic else "left"
 
-st.markdown(f"""
+# Language-independent theme stylesheet; editor font/direction come from CSS
+# variables (_editor_css). A plain string, so CSS braces are written as-is.
+THEME_CSS = """
     <style>
     /* PROFESSIONAL BLUE CORPORATE THEME - Optimized for Performance */
 
-    :root {{
+    :root {
         /* Corporate Blue Palette */
         --primary-blue: #1e3a5f;
         --secondary-blue: #2563eb;
@@ -220,192 +86,202 @@ st.markdown(f"""
         --success: #10b981;
         --warning: #f59e0b;
         --error: #ef4444;
-    }}
+
+        /* Editor language (overridden per language below the stylesheet) */
+        --editor-font: 'Source Sans Pro', sans-serif;
+        --editor-dir: ltr;
+        --editor-align: left;
+    }
 
     /* Base Styles */
-    .stApp {{
+    .stApp {
         background: var(--bg-primary);
         color: var(--text-primary);
         font-family: 'Inter', 'Source Sans Pro', sans-serif;
-    }}
+    }
 
-    h1, h2, h3, h4, h5, h6 {{
+    h1, h2, h3, h4, h5, h6 {
         color: var(--text-primary) !important;
         font-weight: 600 !important;
-    }}
+    }
 
-    p, label, span, div {{
+    p, label, span, div {
         color: var(--text-primary) !important;
         line-height: 1.6;
-    }}
+    }
 
     /* Sidebar */
-    section[data-testid="stSidebar"] {{
+    section[data-testid="stSidebar"] {
         background: var(--sidebar-bg);
         border-right: 1px solid var(--border-color);
-    }}
+    }
 
-    section[data-testid="stSidebar"] > div {{
+    section[data-testid="stSidebar"] > div {
         padding-top: 1rem;
-    }}
+    }
 
-    section[data-testid="stSidebar"] h3 {{
+    section[data-testid="stSidebar"] h3 {
         color: var(--accent-blue);
         font-weight: 600 !important;
         margin-bottom: 0.75rem !important;
-    }}
+    }
 
     /* Cards - Simple & Fast */
-    .css-card {{
+    .css-card {
         background: var(--card-bg);
         padding: 1.5rem;
         border-radius: 8px;
         border: 1px solid var(--border-color);
         margin-bottom: 1rem;
-    }}
+    }
 
-    .css-card:hover {{
+    .css-card:hover {
         border-color: var(--accent-blue);
-    }}
+    }
 
     /* Text Editors */
-    .stTextArea textarea {{
+    .stTextArea textarea {
         background: var(--bg-secondary) !important;
         color: var(--text-primary) !important;
         border: 1px solid var(--border-color) !important;
         border-radius: 8px !important;
-        font-family: {font_family} !important;
+        font-family: var(--editor-font) !important;
         font-size: 16px !important;
         line-height: 1.6 !important;
-        direction: {text_direction} !important;
-        text-align: {editor_align} !important;
+        direction: var(--editor-dir) !important;
+        text-align: var(--editor-align) !important;
         padding: 0.75rem !important;
-    }}
+    }
 
-    .stTextArea textarea:focus {{
+    .stTextArea textarea:focus {
         border-color: var(--accent-blue) !important;
         outline: none !important;
-    }}
+    }
+
+    /* Spacing between legacy-editor blocks (no spacer element per block) */
+    [data-testid="stForm"] .stTextArea {
+        margin-bottom: 15px;
+    }
 
     /* Buttons */
-    div.stButton > button {{
+    div.stButton > button {
         background: var(--card-bg);
         color: var(--text-primary);
         border: 1px solid var(--border-color);
         border-radius: 6px;
         padding: 0.5rem 1rem;
         font-weight: 500;
-    }}
+    }
 
-    div.stButton > button:hover {{
+    div.stButton > button:hover {
         border-color: var(--accent-blue);
         color: var(--light-blue);
-    }}
+    }
 
-    button[kind="primary"] {{
+    button[kind="primary"] {
         background: var(--secondary-blue) !important;
         border: none !important;
         color: white !important;
         font-weight: 600 !important;
-    }}
+    }
 
-    button[kind="primary"]:hover {{
+    button[kind="primary"]:hover {
         background: var(--accent-blue) !important;
-    }}
+    }
 
     /* Form Elements */
     .stSelectbox > div > div,
-    .stRadio > div {{
+    .stRadio > div {
         background: var(--card-bg);
         border: 1px solid var(--border-color);
         border-radius: 6px;
-    }}
+    }
 
     /* Status Messages */
-    .stSuccess {{
+    .stSuccess {
         background: rgba(16, 185, 129, 0.1) !important;
         border-left: 3px solid var(--success) !important;
-    }}
+    }
 
-    .stWarning {{
+    .stWarning {
         background: rgba(245, 158, 11, 0.1) !important;
         border-left: 3px solid var(--warning) !important;
-    }}
+    }
 
-    .stError {{
+    .stError {
         background: rgba(239, 68, 68, 0.1) !important;
         border-left: 3px solid var(--error) !important;
-    }}
+    }
 
-    .stInfo {{
+    .stInfo {
         background: rgba(59, 130, 246, 0.1) !important;
         border-left: 3px solid var(--accent-blue) !important;
-    }}
+    }
 
     /* PDF Viewer */
-    iframe {{
+    iframe {
         border: 1px solid var(--border-color);
         border-radius: 8px;
         background: white;
-    }}
+    }
 
     /* Expanders */
-    div[data-testid="stExpander"] {{
+    div[data-testid="stExpander"] {
         background: var(--card-bg);
         border: 1px solid var(--border-color);
         border-radius: 6px;
         margin-bottom: 0.75rem;
-    }}
+    }
 
     /* File Uploader */
-    .stFileUploader > div {{
+    .stFileUploader > div {
         background: var(--card-bg);
         border: 1px dashed var(--border-color);
         border-radius: 6px;
-    }}
+    }
 
     /* Scrollbar */
-    ::-webkit-scrollbar {{
+    ::-webkit-scrollbar {
         width: 8px;
         height: 8px;
-    }}
+    }
 
-    ::-webkit-scrollbar-track {{
+    ::-webkit-scrollbar-track {
         background: var(--bg-primary);
-    }}
+    }
 
-    ::-webkit-scrollbar-thumb {{
+    ::-webkit-scrollbar-thumb {
         background: var(--border-color);
         border-radius: 4px;
-    }}
+    }
 
-    ::-webkit-scrollbar-thumb:hover {{
+    ::-webkit-scrollbar-thumb:hover {
         background: var(--accent-blue);
-    }}
+    }
 
     /* Scrollable Editor Panel - Left side */
-    .scrollable-editor {{
+    .scrollable-editor {
         max-height: calc(100vh - 250px);
         overflow-y: auto;
         padding-right: 0.5rem;
-    }}
+    }
 
-    .scrollable-editor::-webkit-scrollbar {{
+    .scrollable-editor::-webkit-scrollbar {
         width: 6px;
-    }}
+    }
 
-    .scrollable-editor::-webkit-scrollbar-track {{
+    .scrollable-editor::-webkit-scrollbar-track {
         background: var(--bg-secondary);
         border-radius: 3px;
-    }}
+    }
 
-    .scrollable-editor::-webkit-scrollbar-thumb {{
+    .scrollable-editor::-webkit-scrollbar-thumb {
         background: var(--accent-blue);
         border-radius: 3px;
-    }}
+    }
 
     /* Fixed Preview Panel - Right side */
-    .fixed-preview {{
+    .fixed-preview {
         position: sticky;
         top: 20px;
         max-height: calc(100vh - 180px);
@@ -414,24 +290,24 @@ st.markdown(f"""
         border-radius: 8px;
         padding: 1rem;
         border: 1px solid var(--border-color);
-    }}
+    }
 
-    .fixed-preview::-webkit-scrollbar {{
+    .fixed-preview::-webkit-scrollbar {
         width: 6px;
-    }}
+    }
 
-    .fixed-preview::-webkit-scrollbar-track {{
+    .fixed-preview::-webkit-scrollbar-track {
         background: var(--bg-secondary);
         border-radius: 3px;
-    }}
+    }
 
-    .fixed-preview::-webkit-scrollbar-thumb {{
+    .fixed-preview::-webkit-scrollbar-thumb {
         background: var(--accent-blue);
         border-radius: 3px;
-    }}
+    }
 
     /* Preview Header - Sticky controls */
-    .preview-controls {{
+    .preview-controls {
         position: sticky;
         top: 0;
         background: var(--card-bg);
@@ -439,10 +315,10 @@ st.markdown(f"""
         padding-bottom: 0.75rem;
         margin-bottom: 0.75rem;
         border-bottom: 1px solid var(--border-color);
-    }}
+    }
 
     /* Editor Header - Sticky controls */
-    .editor-controls {{
+    .editor-controls {
         position: sticky;
         top: 0;
         background: var(--bg-primary);
@@ -450,9 +326,21 @@ st.markdown(f"""
         padding-bottom: 0.75rem;
         margin-bottom: 0.75rem;
         border-bottom: 1px solid var(--border-color);
-    }}
+    }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource(show_spinner=False)
+def _editor_css(is_arabic: bool) -> str:
+    """Per-language values for the editor CSS variables used by THEME_CSS"""
+    font = "'Amiri', 'Arial', sans-serif" if is_arabic else "'Source Sans Pro', sans-serif"
+    direction = "rtl" if is_arabic else "ltr"
+    align = "right" if is_arabic else "left"
+    return f"<style>:root {{ --editor-font: {font}; --editor-dir: {direction}; --editor-align: {align}; }}</style>"
+
+st.markdown(THEME_CSS, unsafe_allow_html=True)
+# Always emitted (not only for Arabic) so the elements after it keep their positions
+st.markdown(_editor_css(is_arabic), unsafe_allow_html=True)
 
 # ==========================================
 # 2. FILE SYSTEM & MAPPING LOGIC
@@ -461,19 +349,34 @@ BASE_DIR = os.getcwd()
 IMAGES_DIR = os.path.join(BASE_DIR, "images", "charts")
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
+# Scratch directory for section previews: one session_* build directory per
+# session (.tex/.aux/.log/.pdf) plus the warm worker's standby jobs
+PREVIEW_DIR = os.path.join(BASE_DIR, ".preview_tmp")
+# Finished preview PDFs, named by _preview_key; the least recently used are evicted
+PREVIEW_CACHE_DIR = os.path.join(PREVIEW_DIR, "cache")
+PREVIEW_CACHE_SIZE = 50
+
 # Initialize authentication system
 AUTH_DIR = os.path.join(BASE_DIR, ".auth")
-auth_manager = AuthManager(AUTH_DIR)
-audit_logger = AuditLogger(AUTH_DIR)
+
+@st.cache_resource
+def get_auth_manager(auth_dir: str) -> AuthManager:
+    """One AuthManager per server process, so its users.json cache outlives reruns"""
+    return AuthManager(auth_dir)
+
+@st.cache_resource
+def get_audit_logger(auth_dir: str) -> AuditLogger:
+    """One AuditLogger per server process, sharing its open, buffered log file"""
+    return AuditLogger(auth_dir)
+
+auth_manager = get_auth_manager(AUTH_DIR)
+audit_logger = get_audit_logger(AUTH_DIR)
 
 # ==========================================
 # 3. LOGIN PAGE
 # ==========================================
-def show_login_page():
-    """Render full-screen login page"""
-
-    # Login page styling
-    st.markdown("""
+# Static login page stylesheet (the page has no per-user values to fill in)
+LOGIN_CSS = """
         <style>
         .login-container {
             max-width: 400px;
@@ -497,7 +400,24 @@ def show_login_page():
             font-size: 0.9rem;
         }
         </style>
-    """, unsafe_allow_html=True)
+    """
+
+def login_client_id() -> str:
+    """Scope of the login throttle: the client's IP, else this browser session"""
+    # No IP for localhost connections (and behind some proxies); a session
+    # key still separates users there, though a guesser can open new sessions
+    ip = st.context.ip_address
+    if ip:
+        return ip
+    if 'login_client_id' not in st.session_state:
+        st.session_state['login_client_id'] = "session:" + os.urandom(8).hex()
+    return st.session_state['login_client_id']
+
+def show_login_page():
+    """Render full-screen login page"""
+
+    # Login page styling
+    st.markdown(LOGIN_CSS, unsafe_allow_html=True)
 
     # Center layout
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -526,7 +446,11 @@ def show_login_page():
                 if not username or not password:
                     st.error("Please enter both username and password")
                 else:
-                    user = auth_manager.authenticate(username, password)
+                    try:
+                        user = auth_manager.authenticate(username, password, login_client_id())
+                        throttled = None
+                    except LoginThrottled as e:
+                        user, throttled = None, e
                     if user:
                         # Set session state
                         st.session_state['authenticated'] = True
@@ -538,6 +462,9 @@ def show_login_page():
 
                         st.success(f"Welcome, {username}!")
                         st.rerun()
+                    elif throttled:
+                        audit_logger.log(username, "failed_login", {"reason": "throttled"})
+                        st.error(f"Too many failed attempts from this device. Try again in {throttled.retry_after} s")
                     else:
                         audit_logger.log(username, "failed_login", {"reason": "invalid_credentials"})
                         st.error("Invalid username or password")
@@ -574,40 +501,96 @@ current_role = st.session_state['role']
 # ==========================================
 BACKUP_DIR = os.path.join(BASE_DIR, "templates_backup")
 
+def _copy_file_data(src, dst):
+    """
+    Copy src's bytes to a new file dst, preferring copy_file_range().
+
+    copy_file_range lets the kernel reflink on copy-on-write filesystems
+    (btrfs, XFS) or copy server-side on NFS; shutil.copyfile (sendfile on
+    Linux, fcopyfile on macOS) covers the rest.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                # Returns 0 at end of file
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+                    pass
+            return
+        except FileNotFoundError:
+            raise
+        except OSError:
+            pass  # e.g. EXDEV/ENOSYS on older kernels: plain copy below
+    shutil.copyfile(src, dst)
+
+def _clone_file(src, dst):
+    """
+    Replace dst with a copy of src (a reflink where the filesystem allows).
+
+    Always a real copy, never a hard link: section saves, external editors,
+    git checkout and xdvipdfmx can all write a file in place, which through
+    a shared inode would also change the backup or cache entry. Copying to
+    a temp name and renaming it over dst keeps a restore atomic and gives
+    dst a fresh mtime, so the mtime-keyed caches see the new content.
+    """
+    tmp = dst + ".tmp"
+    Path(tmp).unlink(missing_ok=True)
+    try:
+        _copy_file_data(src, tmp)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    os.replace(tmp, dst)
+
+def _dir_file_pairs(src_dir, dst_dir, suffix=""):
+    """
+    (src, dst) paths for the regular files of src_dir (optionally only *suffix).
+
+    scandir hands back the file type with each entry, so no extra stat calls.
+    """
+    try:
+        entries = os.scandir(src_dir)
+    except FileNotFoundError:
+        return []  # nothing to copy; saves a separate exists() check per call
+    with entries:
+        return [(entry.path, os.path.join(dst_dir, entry.name))
+                for entry in entries
+                if entry.name.endswith(suffix) and entry.is_file()]
+
+def _copy_dir_files(src_dir, dst_dir, suffix=""):
+    """Clone the regular files of src_dir (optionally only *suffix) into dst_dir"""
+    for src, dst in _dir_file_pairs(src_dir, dst_dir, suffix):
+        _clone_file(src, dst)
+
+def _copy_file_if_exists(src, dst):
+    """_clone_file that skips a missing source (no separate exists() check)"""
+    try:
+        _clone_file(src, dst)
+    except FileNotFoundError:
+        if os.path.exists(src):
+            raise  # the destination side is missing, not the source
+
+@st.cache_resource(show_spinner=False)
 def initialize_factory_backup():
-    """Create initial backup of templates if not exists"""
+    """Create initial backup of templates if not exists (runs once per server process)"""
     if not os.path.exists(BACKUP_DIR):
         os.makedirs(BACKUP_DIR)
 
         # Backup content files
         content_backup = os.path.join(BACKUP_DIR, "content")
         os.makedirs(content_backup, exist_ok=True)
-        if os.path.exists(os.path.join(BASE_DIR, "content")):
-            for file in os.listdir(os.path.join(BASE_DIR, "content")):
-                if file.endswith(".tex"):
-                    shutil.copy2(
-                        os.path.join(BASE_DIR, "content", file),
-                        os.path.join(content_backup, file)
-                    )
+        _copy_dir_files(os.path.join(BASE_DIR, "content"), content_backup, ".tex")
 
         # Backup static sections
         static_backup = os.path.join(BACKUP_DIR, "static_sections")
         os.makedirs(static_backup, exist_ok=True)
-        if os.path.exists(os.path.join(BASE_DIR, "static_sections")):
-            for file in os.listdir(os.path.join(BASE_DIR, "static_sections")):
-                if file.endswith(".tex"):
-                    shutil.copy2(
-                        os.path.join(BASE_DIR, "static_sections", file),
-                        os.path.join(static_backup, file)
-                    )
+        _copy_dir_files(os.path.join(BASE_DIR, "static_sections"), static_backup, ".tex")
 
         # Backup config files
         for config_file in ["config.tex", "config_ar.tex"]:
-            if os.path.exists(os.path.join(BASE_DIR, config_file)):
-                shutil.copy2(
-                    os.path.join(BASE_DIR, config_file),
-                    os.path.join(BACKUP_DIR, config_file)
-                )
+            _copy_file_if_exists(
+                os.path.join(BASE_DIR, config_file),
+                os.path.join(BACKUP_DIR, config_file)
+            )
 
         return True
     return False
@@ -624,41 +607,37 @@ def factory_reset(target="all"):
 
     try:
         if target == "all":
-            # Reset all content files
-            backup_content = os.path.join(BACKUP_DIR, "content")
-            if os.path.exists(backup_content):
-                for file in os.listdir(backup_content):
-                    shutil.copy2(
-                        os.path.join(backup_content, file),
-                        os.path.join(BASE_DIR, "content", file)
-                    )
-
-            # Reset all static sections
-            backup_static = os.path.join(BACKUP_DIR, "static_sections")
-            if os.path.exists(backup_static):
-                for file in os.listdir(backup_static):
-                    shutil.copy2(
-                        os.path.join(backup_static, file),
-                        os.path.join(BASE_DIR, "static_sections", file)
-                    )
-
-            # Reset config files
+            # Collect every restore first (content, static sections, config
+            # files), then clone them concurrently; each one is independent
+            tasks = []
+            for subdir in ["content", "static_sections"]:
+                target_dir = os.path.join(BASE_DIR, subdir)
+                os.makedirs(target_dir, exist_ok=True)
+                tasks += _dir_file_pairs(os.path.join(BACKUP_DIR, subdir), target_dir)
             for config_file in ["config.tex", "config_ar.tex"]:
-                if os.path.exists(os.path.join(BACKUP_DIR, config_file)):
-                    shutil.copy2(
-                        os.path.join(BACKUP_DIR, config_file),
-                        os.path.join(BASE_DIR, config_file)
-                    )
+                tasks.append((os.path.join(BACKUP_DIR, config_file),
+                              os.path.join(BASE_DIR, config_file)))
 
-            # Log the reset
-            audit_logger.log(
-                st.session_state.get('username', 'unknown'),
-                "factory_reset",
-                {
-                    "target": target,
-                    "language": st.session_state.get('language', 'Unknown')
-                }
-            )
+            def restore(pair):
+                try:
+                    _copy_file_if_exists(*pair)
+                except OSError as e:
+                    return f"{os.path.relpath(pair[1], BASE_DIR)}: {e}"
+                return None
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                failures = [f for f in pool.map(restore, tasks) if f]
+            if failures:
+                return False, "Reset failed: " + "; ".join(failures)
+
+            # One entry per overwritten file, queued together
+            username = st.session_state.get('username', 'unknown')
+            language = st.session_state.get('language', 'Unknown')
+            audit_logger.log_many([
+                (username, "factory_reset",
+                 {"target": "all", "file": os.path.relpath(dst, BASE_DIR), "language": language})
+                for src, dst in tasks if os.path.exists(src)
+            ])
             return True, "All files restored to factory state"
 
         else:
@@ -673,17 +652,18 @@ def factory_reset(target="all"):
             else:
                 return False, f"File {target} not found in backup"
 
-            shutil.copy2(src, dst)
-            # Log the reset
-            audit_logger.log(
-                st.session_state.get('username', 'unknown'),
-                "factory_reset",
-                {
-                    "target": target,
-                    "language": st.session_state.get('language', 'Unknown')
-                }
-            )
-            return True, f"Restored {target}"
+            _clone_file(src, dst)
+
+        # Log the reset (only queued here; the audit writer thread does the I/O)
+        audit_logger.log(
+            st.session_state.get('username', 'unknown'),
+            "factory_reset",
+            {
+                "target": target,
+                "language": st.session_state.get('language', 'Unknown')
+            }
+        )
+        return True, f"Restored {target}"
 
     except Exception as e:
         return False, f"Reset failed: {str(e)}"
@@ -728,21 +708,161 @@ PROJECT_CONFIG = {
     }
 }
 
+# --- NAVIGATION ---
+# Tab labels per language; Arabic labels map back to the English logic keys
+NAV_OPTIONS = {
+    "English": ["📝 Report Sections", "⚙️ Report Variables", "📊 Chart Manager", "🚀 Finalize & Publish"],
+    "Arabic": ["📝 أقسام التقرير", "⚙️ متغيرات التقرير", "📊 إدارة الرسوم البيانية", "🚀 إنهاء ونشر"]
+}
+ADMIN_NAV_OPTIONS = {
+    "English": ["👥 User Management"],
+    "Arabic": ["👥 إدارة المستخدمين"]
+}
+NAV_MAP = dict(zip(
+    NAV_OPTIONS["Arabic"] + ADMIN_NAV_OPTIONS["Arabic"],
+    NAV_OPTIONS["English"] + ADMIN_NAV_OPTIONS["English"]
+))
+
+# --- ACTIVITY LOG ---
+# Icon per audit action in the Activity Log; unknown actions fall back to 📝
+ACTION_EMOJI = MappingProxyType({
+    'login': '🔓',
+    'logout': '🔒',
+    'save_file': '💾',
+    'generate_pdf': '📄',
+    'generate_preview': '👁️',
+    'factory_reset': '🔄',
+    'create_user': '➕',
+    'upload_chart': '📊',
+    'deactivate_user': '🔒',
+    'activate_user': '🔓',
+    'reset_password': '🔑',
+    'change_password': '🔑'
+})
+
+# --- USER MANAGEMENT ---
+# Accounts listed per page in the Manage Users tab
+USERS_PAGE_SIZE = 25
+# Usernames are stored lowercase: 3-32 ASCII letters, digits or underscores
+_USERNAME_RE = re.compile(r'[a-z0-9_]{3,32}')
+
+def _log_timestamp(timestamp: str) -> str:
+    """'2024-01-31T12:34:56.789Z' -> '2024-01-31 12:34:56'"""
+    return f"{timestamp[:10]} {timestamp[11:19]}"
+
 # Get current config based on selection
 active_config = PROJECT_CONFIG[st.session_state['language']]
-SECTION_MAP = active_config["sections"]
-CONFIG_FILE = os.path.join(BASE_DIR, active_config["config"])
-MAIN_FILE = os.path.join(BASE_DIR, active_config["main"])
+
+@st.cache_resource(show_spinner=False)
+def _resolved_config(language: str) -> MappingProxyType:
+    """Absolute paths of one language's project files, resolved once per process (read-only)"""
+    cfg = PROJECT_CONFIG[language]
+    return MappingProxyType({
+        "main": os.path.join(BASE_DIR, cfg["main"]),
+        "config": os.path.join(BASE_DIR, cfg["config"]),
+        "sections": MappingProxyType({
+            name: os.path.join(BASE_DIR, path) for name, path in cfg["sections"].items()
+        }),
+    })
+
+_resolved = _resolved_config(st.session_state['language'])
+SECTION_MAP = _resolved["sections"]  # section name -> absolute .tex path
+CONFIG_FILE = _resolved["config"]
+MAIN_FILE = _resolved["main"]
 PREAMBLE_FILE = active_config["preamble"]
 
+# Precompiled pattern for the Variables view
+_NEWCOMMAND_RE = re.compile(r'\\newcommand\{\\(\w+)\}\{(.*?)\}')
+
+def _file_version(filepath):
+    """
+    Cache key for a file's contents: (mtime_ns, size, inode), or None if missing.
+
+    mtime alone can miss a save on filesystems with coarse timestamps;
+    save_file's atomic replace always produces a new inode. Never memoized
+    itself: the stat on every call is what lets a save invalidate the
+    content caches keyed on it.
+    """
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+@st.cache_data(show_spinner=False)
+def _load_file_cached(filepath, version):
+    """Read file contents; the file version is part of the cache key so saves invalidate it"""
+    return Path(filepath).read_text(encoding='utf-8')
+
 def load_file(filepath):
-    if not os.path.exists(filepath): return ""
-    with open(filepath, 'r', encoding='utf-8') as f: return f.read()
+    version = _file_version(filepath)
+    if version is None:
+        return ""
+    return _load_file_cached(filepath, version)
+
+@st.cache_data(show_spinner=False)
+def _parse_config_cached(filepath, version):
+    """(name, value) pairs of the \\newcommand definitions in a config file"""
+    return _NEWCOMMAND_RE.findall(_load_file_cached(filepath, version))
+
+def parse_config(filepath):
+    version = _file_version(filepath)
+    if version is None:
+        return []
+    return _parse_config_cached(filepath, version)
+
+@st.cache_data(show_spinner=False)
+def _list_images_cached(images_dir, dir_mtime_ns, extensions):
+    """Sorted image names; the directory mtime changes when files are added or removed"""
+    with os.scandir(images_dir) as entries:
+        return sorted(e.name for e in entries if e.name.lower().endswith(extensions))
+
+def list_images(extensions=('.png', '.jpg', '.jpeg')):
+    try:
+        dir_mtime_ns = os.stat(IMAGES_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    return _list_images_cached(IMAGES_DIR, dir_mtime_ns, extensions)
+
+# Longest side of the chart previews in the editor and Chart Manager
+# (about twice their on-screen width, so they stay sharp on HiDPI screens)
+THUMBNAIL_MAX_PX = 480
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _read_thumbnail_cached(filepath, version, max_px):
+    """
+    PNG bytes scaled to at most max_px per side; the file version keys replaced charts.
+
+    A resampled PNG compresses worse than flat chart art, so the original
+    is kept whenever it is already the smaller of the two.
+    """
+    original = Path(filepath).read_bytes()
+    with Image.open(io.BytesIO(original)) as img:
+        if max(img.size) <= max_px:
+            return original
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")  # palette images resample poorly
+        img.thumbnail((max_px, max_px))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+    return buf.getvalue() if buf.tell() < len(original) else original
+
+def read_thumbnail(filepath, max_px=THUMBNAIL_MAX_PX):
+    return _read_thumbnail_cached(filepath, _file_version(filepath), max_px)
 
 def save_file(filepath, content):
     """Save file with audit logging"""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    # Write a sibling temp file and rename it over the target, so a crash
+    # mid-write never leaves a truncated .tex behind
+    path = Path(filepath)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        tmp.write_text(content, encoding='utf-8')
+        os.replace(tmp, path)
+    except OSError:
+        # Don't leave a half-written sibling behind (e.g. disk full)
+        tmp.unlink(missing_ok=True)
+        raise
 
     # Log the save operation
     audit_logger.log(
@@ -755,101 +875,44 @@ def save_file(filepath, content):
         }
     )
 
-def display_pdf(pdf_path):
-    if not os.path.exists(pdf_path):
-        st.error("Preview file not found.")
-        return
+# Larger previews are offered for download only, not inlined into the page
+PDF_INLINE_MAX_BYTES = 5 * 1024 * 1024
 
-    # Read PDF file
-    with open(pdf_path, "rb") as f:
-        pdf_bytes = f.read()
+@st.cache_data(show_spinner=False, max_entries=4)
+def _pdf_iframe_html(pdf_path, mtime_ns):
+    """Viewer iframe embedding the PDF as a data URI; mtime_ns keys the cache"""
+    base64_pdf = base64.b64encode(Path(pdf_path).read_bytes()).decode('ascii')
+    return f'<iframe src="data:application/pdf;base64,{base64_pdf}#toolbar=0&navpanes=0&scrollbar=0" width="100%" height="800" type="application/pdf"></iframe>'
 
-    # Try iframe method first (works on some browsers)
+def display_pdf(pdf_path):
+    # Embedded in the page rather than served by URL, so the PDF is only
+    # ever sent to this session. The cost is that every render ships the
+    # whole PDF again as base64 (4/3 of its size); only the read and the
+    # encoding are cached, so unrelated reruns skip those.
     try:
-        base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-        pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}#toolbar=0&navpanes=0&scrollbar=0" width="100%" height="800" type="application/pdf"></iframe>'
-        st.markdown(pdf_display, unsafe_allow_html=True)
-    except:
-        pass
+        stat = os.stat(pdf_path)
+        if stat.st_size <= PDF_INLINE_MAX_BYTES:
+            st.markdown(_pdf_iframe_html(pdf_path, stat.st_mtime_ns), unsafe_allow_html=True)
+        else:
+            st.info(f"Preview is {stat.st_size / 1024 / 1024:.1f} MB, too large to show inline. Use the download button below.")
+    except FileNotFoundError:
+        st.error("Preview file not found.")
+        return
 
-    # Always provide download button as fallback
+    # Always provide download button as fallback; the bytes are only read
+    # when it is clicked, and the click does not rerun the page
     st.download_button(
         label="📥 Download Preview PDF",
-        data=pdf_bytes,
+        data=Path(pdf_path).read_bytes,
         file_name=os.path.basename(pdf_path),
         mime="application/pdf",
+        on_click="ignore",
         use_container_width=True
     )
 
 # ==========================================
 # 3. COMPILER & TOOLS
 # ==========================================
-def parse_latex_log(log_path):
-    """Parse LaTeX log file for detailed error information"""
-    if not os.path.exists(log_path):
-        return "Log file not found."
-
-    errors = []
-    warnings = []
-
-    try:
-        with open(log_path, "r", encoding="latin-1", errors='ignore') as f:
-            lines = f.readlines()
-
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-
-            # Critical errors starting with !
-            if line.startswith("!"):
-                context = lines[i:i+5]  # Get more context
-                error_block = "".join(context).strip()
-                errors.append(f"❌ ERROR:\n{error_block}")
-                i += 5
-                continue
-
-            # Missing file errors
-            if "File" in line and "not found" in line:
-                errors.append(f"📁 MISSING FILE:\n{line.strip()}")
-
-            # Font errors
-            if "Font" in line and ("not found" in line or "undefined" in line.lower()):
-                errors.append(f"🔤 FONT ERROR:\n{line.strip()}")
-
-            # Undefined control sequence
-            if "Undefined control sequence" in line:
-                context = lines[i:i+3]
-                errors.append(f"⚠️ UNDEFINED COMMAND:\n{''.join(context).strip()}")
-                i += 3
-                continue
-
-            # Missing package
-            if "LaTeX Error: File" in line and ".sty" in line:
-                errors.append(f"📦 MISSING PACKAGE:\n{line.strip()}")
-
-            # Overfull/underfull boxes (warnings)
-            if "Overfull" in line or "Underfull" in line:
-                warnings.append(line.strip())
-
-            i += 1
-
-        # Build result
-        result_parts = []
-
-        if errors:
-            result_parts.append("=== ERRORS ===\n" + "\n\n".join(errors))
-
-        if warnings and len(warnings) <= 10:  # Only show if not too many
-            result_parts.append("=== WARNINGS ===\n" + "\n".join(warnings[:5]))
-
-        if result_parts:
-            return "\n\n".join(result_parts)
-        else:
-            return "Unknown error. Check LaTeX syntax and file paths."
-
-    except Exception as e:
-        return f"Could not parse log: {str(e)}"
-
 def render_toolbar():
     # Toolbar text logic adjusted for current language if needed (optional)
     st.markdown("##### 🛠️ Quick Tools")
@@ -876,63 +939,419 @@ def render_toolbar():
     with col5:
         if st.button("New Line", width='stretch'): show_hint("Line Break", r"\\")
 
-def generate_preview(content_latex):
+@st.cache_resource(show_spinner=False)
+def _find_tex_tools():
+    """Absolute paths of the TeX drivers, resolved once per server process"""
+    return shutil.which("xelatex") or "xelatex", shutil.which("latexmk"), shutil.which("xdvipdfmx")
+
+XELATEX, LATEXMK, XDVIPDFMX = _find_tex_tools()
+
+def _spawn_cwd(path):
+    """
+    cwd argument for TeX subprocesses.
+
+    With an absolute executable, close_fds=False and no cwd, subprocess uses
+    posix_spawn (vfork) instead of fork+exec; BASE_DIR is normally the
+    process cwd already, so cwd is only passed when it really differs.
+    """
+    return None if path == os.getcwd() else path
+
+
+def run_tex_streaming(cmd, progress):
+    """
+    Run a TeX command, showing its latest output line in the progress placeholder
+    (None when running off the script thread).
+
+    Output is read as it is produced, so the status box stays live. If the
+    script run is interrupted (the user navigates away), the next progress
+    update raises and the process is killed.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        cwd=_spawn_cwd(BASE_DIR),
+        close_fds=False,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace"
+    )
+    try:
+        shown_at = 0.0
+        for line in proc.stdout:
+            line = line.strip()
+            # Throttled: xelatex prints thousands of lines
+            if progress is not None and line and time.monotonic() - shown_at >= 0.25:
+                progress.caption(line[:200])
+                shown_at = time.monotonic()
+        return proc.wait()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+
+def _aux_snapshot(jobbase):
+    """
+    Contents of a job's auxiliary files (None if missing), to tell whether
+    a pass changed them: cross-references, ToC and the figure/table lists.
+    """
+    snapshot = []
+    for ext in (".aux", ".toc", ".lof", ".lot"):
+        try:
+            snapshot.append(Path(jobbase + ext).read_bytes())
+        except FileNotFoundError:
+            snapshot.append(None)
+    return snapshot
+
+
+def build_final_pdf(main_file, progress=None, on_step=None):
+    """
+    Compile a main .tex file into its PDF.
+
+    Returns (pdf_name, None) on success, (pdf_name, error_details) when TeX
+    recovered from errors and still wrote the PDF, or (None, error_details).
+    Safe to run off the script thread when progress and on_step are None.
+    """
+    step = on_step or (lambda msg: None)
+    jobbase = os.path.join(BASE_DIR, os.path.splitext(main_file)[0])
+
+    # A failed run (latexmk -f, nonstopmode, xdvipdfmx) can leave the last
+    # build's PDF in place, where it would pass for this build's output
+    Path(jobbase + ".pdf").unlink(missing_ok=True)
+
+    # IMPORTANT: Arabic needs xelatex
+    if LATEXMK:
+        # latexmk reruns xelatex only while aux/toc still change, and
+        # only the last pass is converted to PDF; -f keeps going past
+        # recoverable errors like the plain xelatex passes do
+        step("Running latexmk (xelatex)...")
+        returncode = run_tex_streaming([LATEXMK, "-pdfxe", "-f", "-interaction=nonstopmode", main_file], progress)
+    else:
+        # Pass 1 only has to produce the aux/toc: -no-pdf (XeTeX's
+        # draft mode) skips writing the PDF
+        before = _aux_snapshot(jobbase)
+        step("Running xelatex (Pass 1)...")
+        Path(jobbase + ".xdv").unlink(missing_ok=True)  # stale, like the PDF
+        pass1 = run_tex_streaming([XELATEX, "-interaction=nonstopmode", "-no-pdf", main_file], progress)
+
+        # Only a clean pass 1 is worth converting as-is; after errors, pass 2
+        # runs as it always did
+        if XDVIPDFMX and pass1 == 0 and _aux_snapshot(jobbase) == before and os.path.exists(jobbase + ".xdv"):
+            # References and ToC were already settled by the previous build,
+            # so pass 1's output is final: just convert it instead of
+            # typesetting the whole document again
+            step("Converting to PDF (references and ToC unchanged, pass 2 skipped)...")
+            returncode = run_tex_streaming([XDVIPDFMX, "-o", os.path.basename(jobbase) + ".pdf",
+                                            os.path.basename(jobbase) + ".xdv"], progress)
+        else:
+            returncode = None
+        if returncode != 0:
+            # Not skipped, or xdvipdfmx failed (its partial PDF must not
+            # count): typeset the PDF directly
+            Path(jobbase + ".pdf").unlink(missing_ok=True)
+            step("Running xelatex (Pass 2 for ToC)...")
+            returncode = run_tex_streaming([XELATEX, "-interaction=nonstopmode", main_file], progress)
+
+    expected_pdf = main_file.replace(".tex", ".pdf")
+    # Parse log file for detailed errors
+    log_file = os.path.join(BASE_DIR, main_file.replace(".tex", ".log"))
+    if not os.path.exists(os.path.join(BASE_DIR, expected_pdf)):
+        return None, parse_latex_log(log_file)
+    if returncode != 0:
+        # Written despite errors: usable, but the user should see them
+        return expected_pdf, parse_latex_log(log_file)
+    return expected_pdf, None
+
+
+class PreviewTexWorker:
+    """
+    Keeps xelatex jobs warmed up for section previews.
+
+    A standby job loads the format, preamble, config and fonts, then waits
+    at a terminal \read right after \begin{document}. Releasing it makes it
+    \input the section body and finish, so a preview skips TeX start-up.
+    There is one standby per preamble/config pair (i.e. per language), so
+    switching languages does not throw away the other language's job.
+    """
+
+    def __init__(self, base_dir: str, build_dir: str):
+        self.base_dir = base_dir
+        self.build_dir = build_dir
+        self.body_file = os.path.join(build_dir, "preview_body.tex")
+        self._lock = threading.Lock()
+        # (preamble, config) -> (process, setup key, jobname)
+        self._standby = {}
+        self._jobs = 0
+
+    def _setup_key(self, preamble: str, config: str) -> tuple:
+        """Identify a preamble/config pair, including the file versions"""
+        return tuple(
+            (name, os.stat(os.path.join(self.base_dir, name)).st_mtime_ns)
+            for name in (preamble, config)
+        )
+
+    def _discard(self, slot: tuple):
+        """Stop a slot's standby job, if any, and delete what it wrote so far"""
+        entry = self._standby.pop(slot, None)
+        if entry is not None:
+            proc, _, jobname = entry
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            for path in glob.glob(os.path.join(self.build_dir, jobname + ".*")):
+                Path(path).unlink(missing_ok=True)
+
+    def close(self):
+        """Stop all standby jobs and remove their files (registered with atexit)"""
+        with self._lock:
+            for slot in list(self._standby):
+                self._discard(slot)
+
+    def prime(self, preamble: str, config: str, wait: bool = True):
+        """
+        Start a standby job for this preamble/config unless one is waiting.
+
+        With wait=False this returns at once while a preview is compiling;
+        that preview primes the next standby job itself.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return
+        try:
+            self._prime(preamble, config)
+        finally:
+            self._lock.release()
+
+    def _prime(self, preamble: str, config: str):
+        slot = (preamble, config)
+        try:
+            setup = self._setup_key(preamble, config)
+        except OSError:
+            return
+        entry = self._standby.get(slot)
+        if entry is not None and entry[1] == setup:
+            # Waiting, or died unused (e.g. a preamble error); in the latter case
+            # the next preview falls back to a cold build and primes again, so
+            # reruns do not respawn a failing job
+            return
+
+        self._discard(slot)
+        os.makedirs(self.build_dir, exist_ok=True)
+        self._jobs += 1
+        jobname = f"preview_w{self._jobs}"
+        driver = (
+            "\\documentclass[a4paper,12pt]{article}"
+            f"\\input{{{preamble}}}\\input{{{config}}}"
+            "\\begin{document}"
+            "\\read16 to\\previewgo"
+            f"\\input{{{os.path.relpath(self.body_file, self.base_dir)}}}"
+            "\\end{document}"
+        )
+        try:
+            # scrollmode: the nonstop modes refuse to \read from the terminal
+            proc = subprocess.Popen(
+                [XELATEX, "-interaction=scrollmode", "-halt-on-error", "-no-shell-escape",
+                 f"-output-directory={os.path.relpath(self.build_dir, self.base_dir)}",
+                 f"-jobname={jobname}", driver],
+                cwd=_spawn_cwd(self.base_dir),
+                close_fds=False,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except OSError:
+            return
+        self._standby[slot] = (proc, setup, jobname)
+
+    def compile(self, preamble: str, config: str, content_latex: str,
+                output_base: str, timeout: int = 60) -> bool:
+        """
+        Typeset content_latex with the standby job.
+
+        The job's .pdf/.log are renamed to output_base + ".pdf"/".log" (the
+        caller's own build directory). Returns False when no matching
+        standby job is ready (caller does a cold build).
+        """
+        with self._lock:
+            slot = (preamble, config)
+            try:
+                setup = self._setup_key(preamble, config)
+            except OSError:
+                return False
+            entry = self._standby.get(slot)
+            if entry is None or entry[0].poll() is not None or entry[1] != setup:
+                self._discard(slot)
+                return False
+
+            proc, _, jobname = self._standby.pop(slot)
+
+            with open(self.body_file, "w", encoding="utf-8") as f:
+                f.write(content_latex)
+            try:
+                proc.communicate(b"\n", timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                raise
+
+            for path in glob.glob(os.path.join(self.build_dir, jobname + ".*")):
+                ext = os.path.splitext(path)[1]
+                if ext in (".pdf", ".log"):
+                    os.replace(path, output_base + ext)
+                else:
+                    os.remove(path)
+            return True
+
+
+@st.cache_resource
+def get_preview_worker():
+    """Process-wide warm xelatex worker for section previews"""
+    worker = PreviewTexWorker(BASE_DIR, PREVIEW_DIR)
+    # Don't leave a blocked xelatex and its partial preview_wN.* files behind
+    atexit.register(worker.close)
+    return worker
+
+
+def _cached_preview(key, preview_pdf):
+    """Put the cached PDF for key in place as preview_pdf; False if there is none"""
+    entry = os.path.join(PREVIEW_CACHE_DIR, key + ".pdf")
+    try:
+        # The copy gets a fresh mtime of its own, which busts the viewer cache
+        _clone_file(entry, preview_pdf)
+        # Touch the entry itself so eviction sees it as recently used
+        os.utime(entry)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _store_preview(key, preview_pdf):
+    """Add a finished preview to the cache and evict the least recently used entries"""
+    os.makedirs(PREVIEW_CACHE_DIR, exist_ok=True)
+    _clone_file(preview_pdf, os.path.join(PREVIEW_CACHE_DIR, key + ".pdf"))
+    # Listing the names needs no stat calls; the entries are only stat'ed
+    # and sorted once the cache is actually over its cap
+    if len(os.listdir(PREVIEW_CACHE_DIR)) <= PREVIEW_CACHE_SIZE:
+        return
+    # Other sessions may be reading an entry evicted here (or evicting the
+    # same ones): _cached_preview treats the FileNotFoundError as a miss and
+    # rebuilds, and a vanished entry simply sorts as oldest here
+    def last_used(entry):
+        try:
+            return entry.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    with os.scandir(PREVIEW_CACHE_DIR) as entries:
+        entries = sorted(entries, key=last_used)
+    for entry in entries[:-PREVIEW_CACHE_SIZE]:
+        Path(entry.path).unlink(missing_ok=True)
+
+def generate_preview(content_latex, worker, build_dir, username="unknown", language="Unknown", key=None):
     """
-    Generates a standalone PDF snippet. 
+    Generates a standalone PDF snippet in build_dir.
     Crucially, uses the active language's preamble to ensure fonts/RTL work.
+    Runs in the preview worker thread, so it must not touch st.session_state.
+    build_dir belongs to one session, whose builds run one at a time, so
+    concurrent users never share the .tex/.pdf/.log files below.
+    With a key (see _preview_key), a PDF already built from the same input is reused.
     """
     preview_filename = "preview_temp"
-    preview_tex = f"{preview_filename}.tex"
-    preview_pdf = f"{preview_filename}.pdf"
-    preview_log = f"{preview_filename}.log"
-    
-    if os.path.exists(preview_pdf): os.remove(preview_pdf)
-    if os.path.exists(preview_log): os.remove(preview_log)
-    
-    # Construct LaTeX wrapper
-    # We include the specific preamble (English or Arabic) and the matching config
-    full_latex_code = f"\\documentclass[a4paper,12pt]{{article}}\n"
-    full_latex_code += f"\\input{{{PREAMBLE_FILE}}}\n"
-    full_latex_code += f"\\input{{{active_config['config']}}}\n"
-    full_latex_code += "\\begin{document}\n"
+    preview_tex = os.path.join(build_dir, f"{preview_filename}.tex")
+    preview_pdf = os.path.join(build_dir, f"{preview_filename}.pdf")
+    preview_log = os.path.join(build_dir, f"{preview_filename}.log")
     
-    # If Arabic, ensure the environment is set if not handled by preamble globally
-    # Ideally preamble_ar.tex has \usepackage{polyglossia} \setmainlanguage{arabic}
-    full_latex_code += content_latex
-    full_latex_code += "\n\\end{document}"
+    # A stale PDF/log would mask a failed build. The .aux/.fdb_latexmk files
+    # stay so latexmk can skip passes whose inputs did not change.
+    for stale in (preview_pdf, preview_log):
+        Path(stale).unlink(missing_ok=True)
     
-    with open(preview_tex, "w", encoding="utf-8") as f:
-        f.write(full_latex_code)
-        
     try:
-        # ALWAYS use xelatex for best compatibility (required for Arabic, fine for English)
-        result = subprocess.run(
-            ["xelatex", "-interaction=nonstopmode", preview_tex],
-            cwd=BASE_DIR,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        if key and _cached_preview(key, preview_pdf):
+            audit_logger.log(
+                username,
+                "generate_preview",
+                {
+                    "language": language,
+                    "success": True,
+                    "cached": True
+                }
+            )
+            return preview_pdf, None
+
+        # Fast path: release the warm standby job with this body. Its
+        # preamble and config are already loaded, so only the body is written.
+        if not worker.compile(PREAMBLE_FILE, active_config['config'], content_latex,
+                              os.path.join(build_dir, preview_filename)):
+            # Construct LaTeX wrapper
+            # We include the specific preamble (English or Arabic) and the matching config
+            full_latex_code = f"\\documentclass[a4paper,12pt]{{article}}\n"
+            full_latex_code += f"\\input{{{PREAMBLE_FILE}}}\n"
+            full_latex_code += f"\\input{{{active_config['config']}}}\n"
+            full_latex_code += "\\begin{document}\n"
+
+            # If Arabic, ensure the environment is set if not handled by preamble globally
+            # Ideally preamble_ar.tex has \usepackage{polyglossia} \setmainlanguage{arabic}
+            full_latex_code += content_latex
+            full_latex_code += "\n\\end{document}"
+
+            with open(preview_tex, "w", encoding="utf-8") as f:
+                f.write(full_latex_code)
+
+            # ALWAYS use xelatex for best compatibility (required for Arabic, fine for English).
+            # Previews typeset whatever is in the editor, so \write18 is refused outright.
+            # latexmk runs only the passes that are needed; build artifacts go to
+            # build_dir (paths are relative to cwd=BASE_DIR, where \input resolves)
+            tex_args = ["-interaction=batchmode", "-halt-on-error", "-no-shell-escape",
+                        f"-output-directory={os.path.relpath(build_dir, BASE_DIR)}",
+                        os.path.relpath(preview_tex, BASE_DIR)]
+            if LATEXMK:
+                cmd = [LATEXMK, "-pdfxe"] + tex_args
+            else:
+                cmd = [XELATEX] + tex_args
+            # Output is discarded, not captured: the .log holds everything
+            # parse_latex_log needs, so there is no pipe to drain
+            subprocess.run(
+                cmd,
+                cwd=_spawn_cwd(BASE_DIR),
+                close_fds=False,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=60
+            )
+
+        # Warm a standby job up for the next preview
+        worker.prime(PREAMBLE_FILE, active_config['config'])
+
+        # One stat both checks for the PDF and gives the version to publish
+        try:
+            pdf_mtime_ns = os.stat(preview_pdf).st_mtime_ns
+        except FileNotFoundError:
+            pdf_mtime_ns = None
 
-        if os.path.exists(preview_pdf):
+        if pdf_mtime_ns is not None:
+            if key:
+                try:
+                    _store_preview(key, preview_pdf)
+                except OSError:
+                    pass  # the cache is best effort; the preview itself is fine
             # Log successful preview
             audit_logger.log(
-                st.session_state.get('username', 'unknown'),
+                username,
                 "generate_preview",
                 {
-                    "language": st.session_state.get('language', 'Unknown'),
+                    "language": language,
                     "success": True
                 }
             )
             return preview_pdf, None
         else:
-            error_msg = parse_latex_log(os.path.join(BASE_DIR, preview_log))
+            error_msg = parse_latex_log(preview_log)
             # Log failed preview
             audit_logger.log(
-                st.session_state.get('username', 'unknown'),
+                username,
                 "generate_preview",
                 {
-                    "language": st.session_state.get('language', 'Unknown'),
+                    "language": language,
                     "success": False,
                     "error": error_msg[:200] if error_msg else "Unknown error"
                 }
@@ -941,40 +1360,162 @@ def generate_preview(content_latex):
     except Exception as e:
         # Log exception
         audit_logger.log(
-            st.session_state.get('username', 'unknown'),
+            username,
             "generate_preview",
             {
-                "language": st.session_state.get('language', 'Unknown'),
+                "language": language,
                 "success": False,
                 "error": str(e)[:200]
             }
         )
         return None, str(e)
 
-def parse_latex_blocks(content):
-    lines = content.splitlines()
-    blocks = []
-    current_chunk = []
-    current_type = None 
-    latex_cmd_pattern = re.compile(r'^(\\|\%|\{|}|\s*\\)')
-
-    for line in lines:
-        is_code = bool(latex_cmd_pattern.match(line.strip())) or line.strip() == ""
-        line_type = 'code' if is_code else 'text'
-        if current_type is None: current_type = line_type
-        
-        if line_type != current_type:
-            blocks.append({'type': current_type, 'content': "\n".join(current_chunk)})
-            current_chunk = [line]
-            current_type = line_type
-        else:
-            current_chunk.append(line)
-    if current_chunk:
-        blocks.append({'type': current_type, 'content': "\n".join(current_chunk)})
-    return blocks
+# Files a section body pulls in (\input, \include, \includegraphics)
+_INCLUDED_FILE_RE = re.compile(r'\\(?:input|include|includegraphics)\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}')
+# Where those names resolve: BASE_DIR and the preambles' \graphicspath
+_INCLUDE_DIRS = ("", "images/static", "images/charts", "images/charts_ar")
+
+def _included_file_version(name):
+    """_file_version of the first file a body reference resolves to, or None"""
+    for directory in _INCLUDE_DIRS:
+        for candidate in (name, name + ".tex"):
+            version = _file_version(os.path.join(BASE_DIR, directory, candidate))
+            if version is not None:
+                return version
+    return None
+
+def _preview_key(content_latex):
+    """
+    Fingerprint of everything a preview PDF depends on: body, preamble and
+    config versions, and the versions of files the body includes (so a
+    replaced chart is not served from the cache).
+    """
+    h = hashlib.blake2b(content_latex.encode('utf-8'), digest_size=16)
+    for name in (PREAMBLE_FILE, active_config['config']):
+        try:
+            h.update(f"|{name}:{os.stat(os.path.join(BASE_DIR, name)).st_mtime_ns}".encode())
+        except OSError:
+            h.update(f"|{name}:-".encode())
+    for name in sorted(set(_INCLUDED_FILE_RE.findall(content_latex))):
+        h.update(f"|{name}:{_included_file_version(name)}".encode())
+    return h.hexdigest()
+
+def submit_preview(content_latex):
+    """Queue a preview build on this session's worker thread"""
+    key = _preview_key(content_latex)
+
+    # Skip the compile when the PDF on screen was built from exactly this input
+    # (the mtime confirms the file is still the build recorded in last_preview)
+    pdf_path = st.session_state.get('preview_pdf_path')
+    last = st.session_state.get('last_preview')
+    if pdf_path and last and last[0] == key:
+        try:
+            unchanged = os.stat(pdf_path).st_mtime_ns == last[1]
+        except OSError:
+            unchanged = False
+        if unchanged:
+            st.toast("✅ " + ("المعاينة محدثة بالفعل" if is_arabic else "Preview is already up to date"))
+            return
+
+    st.session_state['preview_pending_key'] = key
+    if 'pool' not in st.session_state:
+        st.session_state['pool'] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+    if 'preview_dir' not in st.session_state:
+        # This session's own build directory; it is deleted once the session
+        # is dropped and the object is garbage collected
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        st.session_state['preview_dir'] = tempfile.TemporaryDirectory(prefix="session_", dir=PREVIEW_DIR)
+    st.session_state['preview_future'] = st.session_state['pool'].submit(
+        generate_preview,
+        content_latex,
+        get_preview_worker(),
+        st.session_state['preview_dir'].name,
+        st.session_state.get('username', 'unknown'),
+        st.session_state.get('language', 'Unknown'),
+        key
+    )
+
+@st.fragment(run_every=0.5)
+def render_preview_job(is_arabic):
+    """
+    Poll the running preview build; rerun the page once it finishes.
+
+    Callers mount it only while preview_future is set, so the 0.5 s timer
+    exists just for the length of a build.
+    """
+    future = st.session_state.get('preview_future')
+    if future is None:
+        return
+    if not future.done():
+        status_txt = "جاري تجميع ملف المعاينة..." if is_arabic else "Compiling Preview..."
+        st.status(status_txt, state="running")
+        return
+
+    del st.session_state['preview_future']
+    pdf_path, error_msg = future.result()
+    if pdf_path and os.path.exists(pdf_path):
+        st.session_state['preview_pdf_path'] = pdf_path
+        st.session_state['preview_error'] = None
+        st.session_state['preview_generated_at'] = datetime.now().strftime("%H:%M:%S")
+        st.session_state['last_preview'] = (st.session_state.get('preview_pending_key'), os.stat(pdf_path).st_mtime_ns)
+    else:
+        st.session_state['preview_pdf_path'] = None
+        st.session_state['preview_error'] = error_msg
+        st.session_state['last_preview'] = None
+    st.rerun()
 
-def reconstruct_latex(blocks):
-    return "\n".join([b['content'] for b in blocks])
+
+# Cached per content string (latex_utils itself has no Streamlit dependency)
+parse_latex_blocks = st.cache_data(show_spinner=False)(_parse_latex_blocks)
+
+
+# ==========================================
+# LEGACY EDITOR UI FUNCTIONS
+# ==========================================
+
+def _legacy_widget_key(section_name: str, idx: int) -> str:
+    return f"{st.session_state['language']}_{section_name}_{idx}"
+
+def legacy_editor_content(section_name: str, filepath: str) -> str:
+    """The section as last submitted in the legacy form (the file where untouched)"""
+    blocks = parse_latex_blocks(load_file(filepath))
+    return reconstruct_latex([
+        block if block['type'] == 'code'
+        else {'type': 'text', 'content': st.session_state.get(_legacy_widget_key(section_name, idx), block['content'])}
+        for idx, block in enumerate(blocks)
+    ])
+
+@st.fragment
+def render_legacy_editor(section_name: str, filepath: str, is_arabic: bool):
+    """
+    One text area per text block; code lines stay out of reach.
+
+    A fragment, so saving reruns only the form, not the preview column and
+    its embedded PDF.
+    """
+    blocks = parse_latex_blocks(load_file(filepath))
+
+    with st.container(height=800):
+        with st.form(f"edit_form_{section_name}"):
+            for idx, block in enumerate(blocks):
+                if block['type'] == 'text':
+                    h = max(100, len(block['content']) // 1.5)
+                    st.text_area(
+                        f"##",
+                        value=block['content'],
+                        height=int(h),
+                        label_visibility="collapsed",
+                        key=_legacy_widget_key(section_name, idx)
+                    )
+
+            st.markdown("---")
+            btn_save_txt = "💾 حفظ الملف" if is_arabic else "💾 Save to File"
+            save_clicked = st.form_submit_button(btn_save_txt, type="primary", use_container_width=True)
+
+    # Content is reconstructed only when it is saved, not on every rerun
+    if save_clicked:
+        save_file(filepath, legacy_editor_content(section_name, filepath))
+        st.toast(f"✅ Saved {section_name}")
 
 
 # ==========================================
@@ -1222,13 +1763,13 @@ def render_block_editor_form(manager: BlockManager, idx: int, block: Block, sect
         # Show current chart if exists
         chart_path = os.path.join(IMAGES_DIR, block.content)
         if os.path.exists(chart_path):
-            st.image(chart_path, width=250)
+            st.image(read_thumbnail(chart_path), width=250)
         else:
             st.warning(f"Image not found: {block.content}")
 
         # Chart selector
         if os.path.exists(IMAGES_DIR):
-            charts = sorted([f for f in os.listdir(IMAGES_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
+            charts = list_images()
             if charts:
                 current_chart = block.content if block.content in charts else charts[0]
                 selected_chart = st.selectbox(
@@ -1287,7 +1828,7 @@ def render_block_editor_form(manager: BlockManager, idx: int, block: Block, sect
 
         # Chart selector
         if os.path.exists(IMAGES_DIR):
-            charts = sorted([f for f in os.listdir(IMAGES_DIR) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
+            charts = list_images()
             if charts:
                 current_chart = content.get("chart_file", "ch1.png")
                 new_chart = st.selectbox(
@@ -1429,26 +1970,271 @@ def render_block_editor_form(manager: BlockManager, idx: int, block: Block, sect
         st.info("Editor not available for this block type")
 
 
+# ==========================================
+# USER MANAGEMENT UI FUNCTIONS
+# ==========================================
+# Each admin tab is a fragment: its widgets rerun only that tab
+
+@st.fragment
+def render_create_user_tab(is_arabic, current_user):
+    """Create-user form; a new account triggers a full rerun so the other tabs see it"""
+    st.markdown("### Create New User" if not is_arabic else "### إنشاء مستخدم جديد")
+
+    with st.form("create_user_form"):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            new_username = st.text_input(
+                "Username" if not is_arabic else "اسم المستخدم",
+                placeholder="lowercase, alphanumeric",
+                help="3-32 letters, numbers, and underscore only"
+            ).lower()
+            new_password = st.text_input(
+                "Password" if not is_arabic else "كلمة المرور",
+                type="password",
+                help="Minimum 8 characters"
+            )
+
+        with col2:
+            new_role = st.selectbox(
+                "Role" if not is_arabic else "الدور",
+                ["user", "admin"],
+                help="Admin can manage users and access all features"
+            )
+            password_confirm = st.text_input(
+                "Confirm Password" if not is_arabic else "تأكيد كلمة المرور",
+                type="password"
+            )
+
+        st.markdown("---")
+        create_btn = st.form_submit_button(
+            "Create User" if not is_arabic else "إنشاء المستخدم",
+            type="primary",
+            use_container_width=True
+        )
+
+        if create_btn:
+            # Validation
+            if not new_username or not new_password:
+                st.error("Username and password are required" if not is_arabic else "اسم المستخدم وكلمة المرور مطلوبان")
+            elif len(new_password) < 8:
+                st.error("Password must be at least 8 characters" if not is_arabic else "كلمة المرور يجب أن تكون 8 أحرف على الأقل")
+            elif new_password != password_confirm:
+                st.error("Passwords do not match" if not is_arabic else "كلمات المرور غير متطابقة")
+            elif not _USERNAME_RE.fullmatch(new_username):
+                st.error("Username must be 3-32 letters, numbers or underscores" if not is_arabic else "اسم المستخدم يجب أن يكون من 3 إلى 32 حرفاً أو رقماً أو شرطة سفلية")
+            else:
+                # Create user
+                success, message = auth_manager.create_user(
+                    new_username,
+                    new_password,
+                    new_role,
+                    current_user
+                )
+
+                if success:
+                    audit_logger.log(
+                        current_user,
+                        "create_user",
+                        {"new_user": new_username, "role": new_role}
+                    )
+                    st.success(f"✅ {message}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {message}")
+
+@st.dialog("🔑 Reset Password")
+def reset_password_dialog(username, is_arabic, current_user):
+    """Set a new password for one account, opened from its Manage Users entry"""
+    st.markdown(f"**{username}**")
+    new_pw = st.text_input(
+        "New Password" if not is_arabic else "كلمة المرور الجديدة",
+        type="password",
+        key="reset_pw_new"
+    )
+    if st.button("🔑 Reset Password" if not is_arabic else "🔑 إعادة تعيين كلمة المرور", type="primary"):
+        if len(new_pw) < 8:
+            st.error("Password must be at least 8 characters" if not is_arabic else "كلمة المرور يجب أن تكون 8 أحرف على الأقل")
+        else:
+            success, msg = auth_manager.change_password(username, new_pw)
+            if success:
+                audit_logger.log(
+                    current_user,
+                    "reset_password",
+                    {"target_user": username}
+                )
+                st.success(msg)
+
+@st.fragment
+def render_manage_users_tab(is_arabic, current_user, users):
+    """Searchable, paginated user list with status and password actions"""
+    st.markdown("### User List" if not is_arabic else "### قائمة المستخدمين")
+
+    # Search then paginate so only one page of expanders is built per rerun
+    search = st.text_input(
+        "Search username:" if not is_arabic else "البحث عن مستخدم:"
+    ).strip().lower()
+    listed = [u for u in users if search in u['username'].lower()] if search else users
+    page_count = max(1, -(-len(listed) // USERS_PAGE_SIZE))
+    page = 1
+    if page_count > 1:
+        page = st.number_input(
+            "Page" if not is_arabic else "الصفحة",
+            min_value=1, max_value=page_count, value=1, step=1
+        )
+        st.caption(f"{len(listed)} users, page {page}/{page_count}" if not is_arabic
+                   else f"{len(listed)} مستخدم، الصفحة {page}/{page_count}")
+    page_users = listed[(page - 1) * USERS_PAGE_SIZE:page * USERS_PAGE_SIZE]
+
+    if not page_users:
+        st.info("No users found" if not is_arabic else "لم يتم العثور على مستخدمين")
+    else:
+        for user in page_users:
+            with st.expander(
+                f"{'🟢' if user['is_active'] else '🔴'} {user['username']} ({user['role']})",
+                expanded=False
+            ):
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.markdown(f"""
+                    **Username:** `{user['username']}`
+                    **Role:** {user['role']}
+                    **Status:** {'✅ Active' if user['is_active'] else '❌ Inactive'}
+                    **Created:** {user['created_at'][:10]}
+                    **Created By:** {user['created_by']}
+                    **Last Login:** {user['last_login'][:10] if user['last_login'] else 'Never'}
+                    """)
+
+                with col2:
+                    # Actions
+                    st.markdown("**Actions:**" if not is_arabic else "**الإجراءات:**")
+
+                    # Prevent self-modification
+                    if user['username'] == current_user:
+                        st.info("Cannot modify your own account" if not is_arabic else "لا يمكن تعديل حسابك")
+                    else:
+                        # Deactivate/Activate
+                        if user['is_active']:
+                            if st.button(
+                                f"🔒 Deactivate {user['username']}" if not is_arabic else f"🔒 تعطيل {user['username']}",
+                                key=f"deactivate_{user['username']}"
+                            ):
+                                success, msg = auth_manager.update_user_status(
+                                    user['username'], False
+                                )
+                                if success:
+                                    audit_logger.log(
+                                        current_user,
+                                        "deactivate_user",
+                                        {"target_user": user['username']}
+                                    )
+                                    st.success(msg)
+                                    st.rerun()
+                        else:
+                            if st.button(
+                                f"🔓 Activate {user['username']}" if not is_arabic else f"🔓 تفعيل {user['username']}",
+                                key=f"activate_{user['username']}"
+                            ):
+                                success, msg = auth_manager.update_user_status(
+                                    user['username'], True
+                                )
+                                if success:
+                                    audit_logger.log(
+                                        current_user,
+                                        "activate_user",
+                                        {"target_user": user['username']}
+                                    )
+                                    st.success(msg)
+                                    st.rerun()
+
+                        # Reset Password (one shared dialog instead of a form per user)
+                        if st.button(
+                            "🔑 Reset Password" if not is_arabic else "🔑 إعادة تعيين كلمة المرور",
+                            key=f"reset_pw_{user['username']}"
+                        ):
+                            reset_password_dialog(user['username'], is_arabic, current_user)
+
+@st.fragment
+def render_activity_log_tab(is_arabic, usernames):
+    """Filtered view of the most recent audit log entries"""
+    st.markdown("### Recent Activity" if not is_arabic else "### النشاط الأخير")
+
+    # Filter options
+    col_filter1, col_filter2, col_filter3 = st.columns(3)
+    with col_filter1:
+        log_limit = st.selectbox("Show entries:" if not is_arabic else "عرض الإدخالات:", [50, 100, 200, 500], index=1)
+    with col_filter2:
+        filter_user = st.selectbox(
+            "Filter by user:" if not is_arabic else "تصفية حسب المستخدم:",
+            ["All"] + usernames
+        )
+    with col_filter3:
+        filter_action = st.selectbox(
+            "Filter by action:" if not is_arabic else "تصفية حسب الإجراء:",
+            ["All", "login", "logout", "save_file", "generate_pdf",
+             "factory_reset", "create_user", "upload_chart"]
+        )
+
+    # Get logs
+    logs = audit_logger.get_recent_logs(limit=log_limit)
+
+    # Apply both filters in one pass, newest first
+    any_user = filter_user == "All"
+    any_action = filter_action == "All"
+    logs = [
+        log for log in reversed(logs)
+        if (any_user or log['username'] == filter_user)
+        and (any_action or log['action'] == filter_action)
+    ]
+
+    if not logs:
+        st.info("No activity logs found" if not is_arabic else "لم يتم العثور على سجلات نشاط")
+    else:
+        # Display as table
+        st.markdown(f"**Showing {len(logs)} entries**" if not is_arabic else f"**عرض {len(logs)} إدخال**")
+
+        for log in logs:
+            with st.expander(
+                f"{ACTION_EMOJI.get(log['action'], '📝')} {_log_timestamp(log['timestamp'])} | {log['username']} | {log['action']}",
+                expanded=False
+            ):
+                st.json(log['details'])
+
 # ==========================================
 # 4. SIDEBAR NAVIGATION
 # ==========================================
-with st.sidebar:
-    # User Info Section
-    st.markdown(f"""
+# Static sidebar markup; only the user card has fields to fill in
+SIDEBAR_USER_CARD_HTML = """
         <div style='background: var(--card-bg); padding: 1rem; border-radius: 8px;
                     border: 1px solid var(--border-color); margin-bottom: 1rem;'>
             <div style='display: flex; justify-content: space-between; align-items: center;'>
                 <div>
                     <div style='color: var(--accent-blue); font-weight: 600;'>
-                        👤 {current_user}
+                        👤 {user}
                     </div>
                     <div style='color: var(--text-secondary); font-size: 0.8rem;'>
-                        {current_role.upper()}
+                        {role}
                     </div>
                 </div>
             </div>
         </div>
-    """, unsafe_allow_html=True)
+"""
+
+SIDEBAR_BRAND_HTML = """
+        <div style='text-align: center; padding: 0.5rem 0; margin-bottom: 0.5rem;'>
+            <h3 style='color: #3b82f6; font-weight: 600; font-size: 1.5rem; margin: 0;'>
+                ECES Barometer
+            </h3>
+        </div>
+"""
+
+with st.sidebar:
+    # User Info Section
+    st.markdown(
+        SIDEBAR_USER_CARD_HTML.format(user=html.escape(current_user), role=current_role.upper()),
+        unsafe_allow_html=True
+    )
 
     # Logout Button
     if st.button("🚪 Logout", use_container_width=True):
@@ -1463,56 +2249,29 @@ with st.sidebar:
 
     st.image("https://via.placeholder.com/200x60/262730/4facfe?text=ECES+Barometer", width='stretch')
 
-    st.markdown("""
-        <div style='text-align: center; padding: 0.5rem 0; margin-bottom: 0.5rem;'>
-            <h3 style='color: #3b82f6; font-weight: 600; font-size: 1.5rem; margin: 0;'>
-                ECES Barometer
-            </h3>
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(SIDEBAR_BRAND_HTML, unsafe_allow_html=True)
 
     # --- LANGUAGE TOGGLE ---
     st.markdown("### 🌍 Language / اللغة")
-    selected_lang = st.radio(
+    def _on_language_change():
+        # Runs before the rerun, so the whole script already sees the new
+        # language (and loads the matching file maps) without a second pass
+        st.session_state['language'] = st.session_state['language_radio']
+        st.session_state['pdf_ready'] = False # Reset PDF status
+
+    st.radio(
         "Select Language",
         ["English", "Arabic"],
         index=0 if st.session_state['language'] == 'English' else 1,
+        key="language_radio",
+        on_change=_on_language_change,
         label_visibility="collapsed",
         horizontal=True
     )
-    
-    # Update state and rerun if changed to load correct file maps
-    if selected_lang != st.session_state['language']:
-        st.session_state['language'] = selected_lang
-        st.session_state['pdf_ready'] = False # Reset PDF status
-        st.rerun()
 
     st.markdown("---")
     st.markdown("### Control Center")
 
-    # Base navigation options
-    base_nav_english = ["📝 Report Sections", "⚙️ Report Variables", "📊 Chart Manager", "🚀 Finalize & Publish"]
-    base_nav_arabic = ["📝 أقسام التقرير", "⚙️ متغيرات التقرير", "📊 إدارة الرسوم البيانية", "🚀 إنهاء ونشر"]
-
-    # Add admin panel for admin users
-    if current_role == "admin":
-        nav_options = {
-            "English": base_nav_english + ["👥 User Management"],
-            "Arabic": base_nav_arabic + ["👥 إدارة المستخدمين"]
-        }
-    else:
-        nav_options = {
-            "English": base_nav_english,
-            "Arabic": base_nav_arabic
-        }
-    
-    # Map Arabic selections back to English logic keys
-    nav_map = dict(zip(nav_options["Arabic"], nav_options["English"]))
-
-    # Store navigation options for use outside sidebar
-    st.session_state['nav_options'] = nav_options
-    st.session_state['nav_map'] = nav_map
-
     st.markdown("---")
     if is_arabic:
         st.info("💡 **تلميح:** 'المعاينة' تقوم بتجميع القسم الحالي فقط.")
@@ -1540,11 +2299,17 @@ with st.sidebar:
                 else:
                     st.info("Open a section first to reset it.")
 
+        def _set_confirm_reset_all(value):
+            st.session_state['confirm_reset_all'] = value
+
+        def _confirm_reset_all():
+            st.session_state['reset_all_result'] = factory_reset(target="all")
+            st.session_state['confirm_reset_all'] = False
+
         with col_reset2:
-            if st.button("Reset All", use_container_width=True, type="primary", key="reset_all_trigger"):
-                # Confirmation via session state
-                st.session_state['confirm_reset_all'] = True
-                st.rerun()
+            # Confirmation via session state
+            st.button("Reset All", use_container_width=True, type="primary", key="reset_all_trigger",
+                      on_click=_set_confirm_reset_all, args=(True,))
 
         # Confirmation dialog
         if st.session_state.get('confirm_reset_all'):
@@ -1552,19 +2317,19 @@ with st.sidebar:
             col_yes, col_no = st.columns(2)
 
             with col_yes:
-                if st.button("✓ Confirm", use_container_width=True, key="confirm_yes"):
-                    success, msg = factory_reset(target="all")
-                    st.session_state['confirm_reset_all'] = False
-                    if success:
-                        st.success(msg)
-                        st.rerun()
-                    else:
-                        st.error(msg)
+                st.button("✓ Confirm", use_container_width=True, key="confirm_yes",
+                          on_click=_confirm_reset_all)
 
             with col_no:
-                if st.button("✗ Cancel", use_container_width=True, key="confirm_no"):
-                    st.session_state['confirm_reset_all'] = False
-                    st.rerun()
+                st.button("✗ Cancel", use_container_width=True, key="confirm_no",
+                          on_click=_set_confirm_reset_all, args=(False,))
+
+        if 'reset_all_result' in st.session_state:
+            success, msg = st.session_state.pop('reset_all_result')
+            if success:
+                st.success(msg)
+            else:
+                st.error(msg)
 
     # Password Change Section
     st.markdown("---")
@@ -1578,8 +2343,15 @@ with st.sidebar:
 
             if st.form_submit_button("Update Password" if not is_arabic else "تحديث كلمة المرور", use_container_width=True):
                 # Verify current password
-                user = auth_manager.authenticate(current_user, current_pw)
-                if not user:
+                try:
+                    user = auth_manager.authenticate(current_user, current_pw, login_client_id())
+                    throttled = None
+                except LoginThrottled as e:
+                    user, throttled = None, e
+                if throttled:
+                    st.error(f"Too many failed attempts. Try again in {throttled.retry_after} s" if not is_arabic
+                             else f"محاولات فاشلة كثيرة. حاول مرة أخرى بعد {throttled.retry_after} ثانية")
+                elif not user:
                     st.error("Current password is incorrect" if not is_arabic else "كلمة المرور الحالية غير صحيحة")
                 elif len(new_pw) < 8:
                     st.error("New password must be at least 8 characters" if not is_arabic else "كلمة المرور الجديدة يجب أن تكون 8 أحرف على الأقل")
@@ -1596,26 +2368,17 @@ with st.sidebar:
 # ==========================================
 # HORIZONTAL NAVIGATION (MAIN CONTENT)
 # ==========================================
-nav_options = st.session_state.get('nav_options', {
-    "English": ["📝 Report Sections", "⚙️ Report Variables", "📊 Chart Manager", "🚀 Finalize & Publish"],
-    "Arabic": ["📝 أقسام التقرير", "⚙️ متغيرات التقرير", "📊 إدارة الرسوم البيانية", "🚀 إنهاء ونشر"]
-})
-nav_map = st.session_state.get('nav_map', {})
-
-# Add admin panel if user is admin
+nav_items = NAV_OPTIONS[st.session_state['language']]
 if current_role == "admin":
-    if "👥 User Management" not in nav_options["English"]:
-        nav_options["English"].append("👥 User Management")
-        nav_options["Arabic"].append("👥 إدارة المستخدمين")
-        nav_map["👥 إدارة المستخدمين"] = "👥 User Management"
+    nav_items = nav_items + ADMIN_NAV_OPTIONS[st.session_state['language']]
 
 # Initialize selected navigation
 if 'selected_nav' not in st.session_state:
-    st.session_state['selected_nav'] = nav_options[st.session_state['language']][0]
+    st.session_state['selected_nav'] = nav_items[0]
 
 # Horizontal navigation tabs
-nav_cols = st.columns(len(nav_options[st.session_state['language']]))
-for i, (col, nav_item) in enumerate(zip(nav_cols, nav_options[st.session_state['language']])):
+nav_cols = st.columns(len(nav_items))
+for i, (col, nav_item) in enumerate(zip(nav_cols, nav_items)):
     with col:
         is_selected = st.session_state['selected_nav'] == nav_item
         btn_type = "primary" if is_selected else "secondary"
@@ -1625,7 +2388,7 @@ for i, (col, nav_item) in enumerate(zip(nav_cols, nav_options[st.session_state['
 
 # Get the normalized view name
 selected_view_display = st.session_state['selected_nav']
-selected_view = nav_map.get(selected_view_display, selected_view_display)
+selected_view = NAV_MAP.get(selected_view_display, selected_view_display)
 
 st.markdown("---")
 
@@ -1636,6 +2399,9 @@ if selected_view == "📝 Report Sections":
     header_text = "📝 محرر المحتوى والمعاينة" if is_arabic else "📝 Content Editor & Preview"
     st.markdown(f"## {header_text}")
 
+    # Have a warm xelatex job waiting before the first preview is requested
+    get_preview_worker().prime(PREAMBLE_FILE, active_config['config'], wait=False)
+
     # Initialize editor mode in session state
     if 'editor_mode' not in st.session_state:
         st.session_state['editor_mode'] = 'block'  # Default to block editor
@@ -1659,7 +2425,7 @@ if selected_view == "📝 Report Sections":
         )
         st.session_state['editor_mode'] = 'block' if editor_mode == "🧱 Block" else 'legacy'
 
-    current_file_path = os.path.join(BASE_DIR, SECTION_MAP[current_section_name])
+    current_file_path = SECTION_MAP[current_section_name]
 
     # Check if file exists, if not create empty
     if not os.path.exists(current_file_path):
@@ -1686,6 +2452,7 @@ if selected_view == "📝 Report Sections":
         if st.session_state.get('preview_section') != current_section_name:
             st.session_state['preview_pdf_path'] = None
             st.session_state['preview_error'] = None
+            st.session_state.pop('preview_future', None)
             st.session_state['preview_section'] = current_section_name
 
         # Split view: Editor left, Preview right
@@ -1733,22 +2500,10 @@ if selected_view == "📝 Report Sections":
                     # Get current content from the block manager
                     if editor_key in st.session_state:
                         manager = st.session_state[editor_key]["manager"]
-                        current_draft_latex = manager.generate_latex()
-
-                        status_txt = "جاري تجميع ملف المعاينة..." if is_arabic else "Compiling Preview..."
-                        with st.status(status_txt, expanded=True) as status:
-                            pdf_path, error_msg = generate_preview(current_draft_latex)
-
-                            if pdf_path and os.path.exists(pdf_path):
-                                status.update(label="✅ " + ("تم بنجاح" if is_arabic else "Success!"), state="complete", expanded=False)
-                                st.session_state['preview_pdf_path'] = pdf_path
-                                st.session_state['preview_error'] = None
-                                st.session_state['preview_generated_at'] = datetime.now().strftime("%H:%M:%S")
-                                st.rerun()
-                            else:
-                                status.update(label="❌ " + ("فشل" if is_arabic else "Failed"), state="error")
-                                st.session_state['preview_pdf_path'] = None
-                                st.session_state['preview_error'] = error_msg
+                        submit_preview(manager.generate_latex())
+                # Mounted only while a build runs, so idle pages don't poll
+                if 'preview_future' in st.session_state:
+                    render_preview_job(is_arabic)
             
             with col_clear:
                 clear_txt = "🗑️ " + ("مسح" if is_arabic else "Clear")
@@ -1777,13 +2532,11 @@ if selected_view == "📝 Report Sections":
 
     # ===== LEGACY EDITOR MODE =====
     else:
-        raw_content = load_file(current_file_path)
-        blocks = parse_latex_blocks(raw_content)
-
         # Auto-clear preview when switching sections
         if st.session_state.get('preview_section') != current_section_name:
             st.session_state['preview_pdf_path'] = None
             st.session_state['preview_error'] = None
+            st.session_state.pop('preview_future', None)
             st.session_state['preview_section'] = current_section_name
 
         col_editor, col_preview = st.columns([1, 1])
@@ -1791,35 +2544,7 @@ if selected_view == "📝 Report Sections":
         # --- EDITOR ---
         with col_editor:
             st.subheader("Edit Content" if not is_arabic else "تحرير المحتوى")
-
-            with st.container(height=800):
-                with st.form(f"edit_form_{current_section_name}"):
-                    edited_blocks = []
-                    for idx, block in enumerate(blocks):
-                        if block['type'] == 'code':
-                            edited_blocks.append(block)
-                        else:
-                            h = max(100, len(block['content']) // 1.5)
-                            new_text = st.text_area(
-                                f"##",
-                                value=block['content'],
-                                height=int(h),
-                                label_visibility="collapsed",
-                                key=f"{st.session_state['language']}_{current_section_name}_{idx}"
-                            )
-                            edited_blocks.append({'type': 'text', 'content': new_text})
-                            st.markdown("<div style='height:15px'></div>", unsafe_allow_html=True)
-
-                    st.markdown("---")
-                    btn_save_txt = "💾 حفظ الملف" if is_arabic else "💾 Save to File"
-                    save_clicked = st.form_submit_button(btn_save_txt, type="primary", use_container_width=True)
-
-            # Reconstruct content OUTSIDE form so preview can access it
-            current_draft_latex = reconstruct_latex(edited_blocks)
-
-            if save_clicked:
-                save_file(current_file_path, current_draft_latex)
-                st.toast(f"✅ Saved {current_section_name}")
+            render_legacy_editor(current_section_name, current_file_path, is_arabic)
 
         # --- PREVIEW ---
         with col_preview:
@@ -1830,20 +2555,10 @@ if selected_view == "📝 Report Sections":
             with col_gen:
                 btn_prev_txt = "👁️ " + ("تحديث المعاينة" if is_arabic else "Regenerate")
                 if st.button(btn_prev_txt, use_container_width=True, type="primary", key=f"preview_{current_section_name}"):
-                    status_txt = "جاري تجميع ملف المعاينة..." if is_arabic else "Compiling Preview..."
-                    with st.status(status_txt, expanded=True) as status:
-                        pdf_path, error_msg = generate_preview(current_draft_latex)
-
-                        if pdf_path and os.path.exists(pdf_path):
-                            status.update(label="✅ " + ("تم بنجاح" if is_arabic else "Success!"), state="complete", expanded=False)
-                            st.session_state['preview_pdf_path'] = pdf_path
-                            st.session_state['preview_error'] = None
-                            st.session_state['preview_generated_at'] = datetime.now().strftime("%H:%M:%S")
-                            st.rerun()
-                        else:
-                            status.update(label="❌ " + ("فشل" if is_arabic else "Failed"), state="error")
-                            st.session_state['preview_pdf_path'] = None
-                            st.session_state['preview_error'] = error_msg
+                    submit_preview(legacy_editor_content(current_section_name, current_file_path))
+                # Mounted only while a build runs, so idle pages don't poll
+                if 'preview_future' in st.session_state:
+                    render_preview_job(is_arabic)
             
             with col_clear:
                 clear_txt = "🗑️ " + ("مسح" if is_arabic else "Clear")
@@ -1885,9 +2600,7 @@ elif selected_view == "⚙️ Report Variables":
     """, unsafe_allow_html=True)
 
     if os.path.exists(CONFIG_FILE):
-        raw_config = load_file(CONFIG_FILE)
-        pattern = re.compile(r'\\newcommand\{\\(\w+)\}\{(.*?)\}')
-        matches = pattern.findall(raw_config)
+        matches = parse_config(CONFIG_FILE)
         
         with st.form("config_form"):
             updates = {}
@@ -1902,15 +2615,22 @@ elif selected_view == "⚙️ Report Variables":
             st.markdown("---")
             btn_txt = "💾 تحديث المتغيرات" if is_arabic else "💾 Update Variables"
             if st.form_submit_button(btn_txt, type="primary"):
-                new_config = raw_config
-                for key, val in updates.items():
-                    safe_val = val.replace('\\', '\\\\')
-                    regex_replace = r'(\\newcommand\{\\' + key + r'\}\{)(.*?)(\})'
-                    new_config = re.sub(regex_replace, r'\g<1>' + safe_val + r'\g<3>', new_config)
-                
-                save_file(CONFIG_FILE, new_config)
-                st.toast("Updated!", icon="⚙️")
-                st.rerun()
+                # Single pass: the callback returns the value verbatim, so no
+                # backslash escaping is needed for the replacement
+                old_config = load_file(CONFIG_FILE)
+                new_config = _NEWCOMMAND_RE.sub(
+                    lambda m: f"\\newcommand{{\\{m.group(1)}}}{{{updates.get(m.group(1), m.group(2))}}}",
+                    old_config
+                )
+
+                if new_config == old_config:
+                    # Saving would only bump the mtime, which invalidates the
+                    # warm preview job and every cached preview
+                    st.toast("لا توجد تغييرات" if is_arabic else "No changes to save", icon="ℹ️")
+                else:
+                    save_file(CONFIG_FILE, new_config)
+                    st.toast("Updated!", icon="⚙️")
+                    st.rerun()
     else:
         st.error(f"{active_config['config']} not found.")
 
@@ -1922,7 +2642,7 @@ elif selected_view == "📊 Chart Manager":
     st.markdown(f"## {header}")
     
     if os.path.exists(IMAGES_DIR):
-        files = sorted([f for f in os.listdir(IMAGES_DIR) if f.lower().endswith(".png")])
+        files = list_images((".png",))
         cols = st.columns(3)
         for idx, filename in enumerate(files):
             col = cols[idx % 3]
@@ -1930,7 +2650,7 @@ elif selected_view == "📊 Chart Manager":
             with col:
                 with st.container(border=True):
                     st.markdown(f"**{filename}**")
-                    st.image(filepath, width='stretch')
+                    st.image(read_thumbnail(filepath), width='stretch')
                     lbl = "استبدال" if is_arabic else "Replace"
                     uploaded = st.file_uploader(f"{lbl} {filename}", type=["png"], key=filename)
                     if uploaded:
@@ -1968,72 +2688,88 @@ elif selected_view == "🚀 Finalize & Publish":
         st.markdown(msg, unsafe_allow_html=True)
         
         btn_txt = "بدء التجميع الكامل" if is_arabic else "Generate Full PDF"
-        
+        both_txt = "تجميع اللغتين معاً (English + العربية)" if is_arabic else "Build both languages (English + Arabic)"
+        build_both = st.checkbox(both_txt, key="build_both_languages")
+
         if st.button(btn_txt, type="primary"):
             with st.status("Processing..." if not is_arabic else "جاري المعالجة...", expanded=True) as status:
                 try:
-                    # IMPORTANT: Arabic needs xelatex
-                    cmd = ["xelatex", "-interaction=nonstopmode", target_main]
-
-                    st.write("Running xelatex (Pass 1)...")
-                    result1 = subprocess.run(cmd, cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-                    st.write("Running xelatex (Pass 2 for ToC)...")
-                    result2 = subprocess.run(cmd, cwd=BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                    
-                    expected_pdf = target_main.replace(".tex", ".pdf")
-                    if os.path.exists(os.path.join(BASE_DIR, expected_pdf)):
-                        # Log successful compilation
-                        audit_logger.log(
-                            st.session_state.get('username', 'unknown'),
-                            "generate_pdf",
-                            {
-                                "language": st.session_state.get('language', 'Unknown'),
-                                "main_file": target_main,
+                    if build_both:
+                        # main.tex / main_ar.tex have distinct job names, so their
+                        # aux/log files never collide; the work happens in the
+                        # xelatex child processes, so two threads are enough
+                        targets = {lang: cfg["main"] for lang, cfg in PROJECT_CONFIG.items()}
+                        st.write("Running both builds in parallel...")
+                        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+                            futures = {lang: pool.submit(build_final_pdf, main_file) for lang, main_file in targets.items()}
+                            results = {lang: future.result() for lang, future in futures.items()}
+                    else:
+                        progress = st.empty()
+                        results = {
+                            st.session_state['language']: build_final_pdf(target_main, progress, on_step=st.write)
+                        }
+                        progress.empty()
+
+                    built = []
+                    # One generate_pdf entry per language, queued together below
+                    log_entries = []
+                    username = st.session_state.get('username', 'unknown')
+                    for lang, (pdf_name, error_details) in results.items():
+                        main_file = PROJECT_CONFIG[lang]["main"]
+                        if pdf_name:
+                            # Log successful compilation
+                            details = {
+                                "language": lang,
+                                "main_file": main_file,
                                 "success": True
                             }
-                        )
-                        status.update(label="Success!", state="complete", expanded=False)
-                        st.session_state['pdf_ready'] = True
-                        st.session_state['final_pdf_name'] = expected_pdf
-                    else:
-                        # Log failed compilation
-                        # Parse log file for detailed errors
-                        log_file = target_main.replace(".tex", ".log")
-                        error_details = parse_latex_log(os.path.join(BASE_DIR, log_file))
-
-                        audit_logger.log(
-                            st.session_state.get('username', 'unknown'),
-                            "generate_pdf",
-                            {
-                                "language": st.session_state.get('language', 'Unknown'),
-                                "main_file": target_main,
+                            if error_details:
+                                details["error"] = error_details[:500]
+                            log_entries.append((username, "generate_pdf", details))
+                            built.append(pdf_name)
+                            if error_details:
+                                # TeX recovered and wrote the PDF anyway
+                                st.warning(f"{main_file}: PDF was created, but LaTeX reported errors.")
+                                with st.expander(f"📋 Compilation Error Details ({main_file})"):
+                                    st.code(error_details, language="text")
+                        else:
+                            # Log failed compilation
+                            log_entries.append((username, "generate_pdf", {
+                                "language": lang,
+                                "main_file": main_file,
                                 "success": False,
                                 "error": error_details[:500] if error_details else "Unknown"
-                            }
-                        )
-                        status.update(label="Compilation Failed", state="error")
-                        st.error("PDF was not created. See error details below.")
+                            }))
+                            st.error(f"{main_file}: PDF was not created. See error details below.")
 
-                        # Show detailed errors in expandable section
-                        with st.expander("📋 Compilation Error Details", expanded=True):
-                            st.code(error_details, language="text")
+                            # Show detailed errors in expandable section
+                            with st.expander(f"📋 Compilation Error Details ({main_file})", expanded=True):
+                                st.code(error_details, language="text")
+
+                    audit_logger.log_many(log_entries)
+                    st.session_state['pdf_ready'] = bool(built)
+                    st.session_state['final_pdf_names'] = built
+                    if len(built) == len(results):
+                        status.update(label="Success!", state="complete", expanded=False)
+                    else:
+                        status.update(label="Compilation Failed", state="error")
                 except Exception as e:
                     status.update(label="Error", state="error")
                     st.error(str(e))
 
     with c2:
         if st.session_state.get('pdf_ready'):
-            final_name = st.session_state.get('final_pdf_name', 'output.pdf')
-            pdf_path = os.path.join(BASE_DIR, final_name)
-            with open(pdf_path, "rb") as f:
+            for final_name in st.session_state.get('final_pdf_names', []):
+                # Deferred: the PDF is read when the button is clicked, not on every rerun
                 st.download_button(
-                    label="📥 Download PDF" if not is_arabic else "📥 تحميل التقرير",
-                    data=f,
+                    label=("📥 Download PDF" if not is_arabic else "📥 تحميل التقرير") + f" ({final_name})",
+                    data=Path(BASE_DIR, final_name).read_bytes,
                     file_name=final_name,
                     mime="application/pdf",
+                    on_click="ignore",
                     type="primary",
-                    width='stretch'
+                    width='stretch',
+                    key=f"download_{final_name}"
                 )
 
 # ==========================================
@@ -2054,220 +2790,13 @@ elif selected_view == "👥 User Management":
         "📊 Activity Log" if not is_arabic else "📊 سجل النشاط"
     ])
 
-    # --- TAB 1: CREATE USER ---
-    with tab1:
-        st.markdown("### Create New User" if not is_arabic else "### إنشاء مستخدم جديد")
-
-        with st.form("create_user_form"):
-            col1, col2 = st.columns(2)
+    # Loaded once for both tabs; every change to the user list reruns the app
+    users = auth_manager.get_all_users()
+    usernames = sorted(u['username'] for u in users)
 
-            with col1:
-                new_username = st.text_input(
-                    "Username" if not is_arabic else "اسم المستخدم",
-                    placeholder="lowercase, alphanumeric",
-                    help="Letters, numbers, and underscore only"
-                )
-                new_password = st.text_input(
-                    "Password" if not is_arabic else "كلمة المرور",
-                    type="password",
-                    help="Minimum 8 characters"
-                )
-
-            with col2:
-                new_role = st.selectbox(
-                    "Role" if not is_arabic else "الدور",
-                    ["user", "admin"],
-                    help="Admin can manage users and access all features"
-                )
-                password_confirm = st.text_input(
-                    "Confirm Password" if not is_arabic else "تأكيد كلمة المرور",
-                    type="password"
-                )
-
-            st.markdown("---")
-            create_btn = st.form_submit_button(
-                "Create User" if not is_arabic else "إنشاء المستخدم",
-                type="primary",
-                use_container_width=True
-            )
-
-            if create_btn:
-                # Validation
-                if not new_username or not new_password:
-                    st.error("Username and password are required" if not is_arabic else "اسم المستخدم وكلمة المرور مطلوبان")
-                elif len(new_password) < 8:
-                    st.error("Password must be at least 8 characters" if not is_arabic else "كلمة المرور يجب أن تكون 8 أحرف على الأقل")
-                elif new_password != password_confirm:
-                    st.error("Passwords do not match" if not is_arabic else "كلمات المرور غير متطابقة")
-                elif not new_username.replace('_', '').isalnum():
-                    st.error("Username must be alphanumeric (underscore allowed)" if not is_arabic else "اسم المستخدم يجب أن يكون أبجدي رقمي")
-                else:
-                    # Create user
-                    success, message = auth_manager.create_user(
-                        new_username.lower(),
-                        new_password,
-                        new_role,
-                        current_user
-                    )
-
-                    if success:
-                        audit_logger.log(
-                            current_user,
-                            "create_user",
-                            {"new_user": new_username, "role": new_role}
-                        )
-                        st.success(f"✅ {message}")
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {message}")
-
-    # --- TAB 2: MANAGE USERS ---
+    with tab1:
+        render_create_user_tab(is_arabic, current_user)
     with tab2:
-        st.markdown("### User List" if not is_arabic else "### قائمة المستخدمين")
-
-        users = auth_manager.get_all_users()
-
-        if not users:
-            st.info("No users found" if not is_arabic else "لم يتم العثور على مستخدمين")
-        else:
-            for user in users:
-                with st.expander(
-                    f"{'🟢' if user['is_active'] else '🔴'} {user['username']} ({user['role']})",
-                    expanded=False
-                ):
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        st.markdown(f"""
-                        **Username:** `{user['username']}`
-                        **Role:** {user['role']}
-                        **Status:** {'✅ Active' if user['is_active'] else '❌ Inactive'}
-                        **Created:** {user['created_at'][:10]}
-                        **Created By:** {user['created_by']}
-                        **Last Login:** {user['last_login'][:10] if user['last_login'] else 'Never'}
-                        """)
-
-                    with col2:
-                        # Actions
-                        st.markdown("**Actions:**" if not is_arabic else "**الإجراءات:**")
-
-                        # Prevent self-modification
-                        if user['username'] == current_user:
-                            st.info("Cannot modify your own account" if not is_arabic else "لا يمكن تعديل حسابك")
-                        else:
-                            # Deactivate/Activate
-                            if user['is_active']:
-                                if st.button(
-                                    f"🔒 Deactivate {user['username']}" if not is_arabic else f"🔒 تعطيل {user['username']}",
-                                    key=f"deactivate_{user['username']}"
-                                ):
-                                    success, msg = auth_manager.update_user_status(
-                                        user['username'], False
-                                    )
-                                    if success:
-                                        audit_logger.log(
-                                            current_user,
-                                            "deactivate_user",
-                                            {"target_user": user['username']}
-                                        )
-                                        st.success(msg)
-                                        st.rerun()
-                            else:
-                                if st.button(
-                                    f"🔓 Activate {user['username']}" if not is_arabic else f"🔓 تفعيل {user['username']}",
-                                    key=f"activate_{user['username']}"
-                                ):
-                                    success, msg = auth_manager.update_user_status(
-                                        user['username'], True
-                                    )
-                                    if success:
-                                        audit_logger.log(
-                                            current_user,
-                                            "activate_user",
-                                            {"target_user": user['username']}
-                                        )
-                                        st.success(msg)
-                                        st.rerun()
-
-                            # Reset Password
-                            with st.form(f"reset_pw_{user['username']}"):
-                                new_pw = st.text_input(
-                                    "New Password" if not is_arabic else "كلمة المرور الجديدة",
-                                    type="password",
-                                    key=f"newpw_{user['username']}"
-                                )
-                                if st.form_submit_button("🔑 Reset Password" if not is_arabic else "🔑 إعادة تعيين كلمة المرور"):
-                                    if len(new_pw) < 8:
-                                        st.error("Password must be at least 8 characters" if not is_arabic else "كلمة المرور يجب أن تكون 8 أحرف على الأقل")
-                                    else:
-                                        success, msg = auth_manager.change_password(
-                                            user['username'], new_pw
-                                        )
-                                        if success:
-                                            audit_logger.log(
-                                                current_user,
-                                                "reset_password",
-                                                {"target_user": user['username']}
-                                            )
-                                            st.success(msg)
-
-    # --- TAB 3: ACTIVITY LOG ---
+        render_manage_users_tab(is_arabic, current_user, users)
     with tab3:
-        st.markdown("### Recent Activity" if not is_arabic else "### النشاط الأخير")
-
-        # Filter options
-        col_filter1, col_filter2, col_filter3 = st.columns(3)
-        with col_filter1:
-            log_limit = st.selectbox("Show entries:" if not is_arabic else "عرض الإدخالات:", [50, 100, 200, 500], index=1)
-        with col_filter2:
-            filter_user = st.selectbox(
-                "Filter by user:" if not is_arabic else "تصفية حسب المستخدم:",
-                ["All"] + [u['username'] for u in users]
-            )
-        with col_filter3:
-            filter_action = st.selectbox(
-                "Filter by action:" if not is_arabic else "تصفية حسب الإجراء:",
-                ["All", "login", "logout", "save_file", "generate_pdf",
-                 "factory_reset", "create_user", "upload_chart"]
-            )
-
-        # Get logs
-        logs = audit_logger.get_recent_logs(limit=log_limit)
-
-        # Apply filters
-        if filter_user != "All":
-            logs = [log for log in logs if log['username'] == filter_user]
-        if filter_action != "All":
-            logs = [log for log in logs if log['action'] == filter_action]
-
-        # Reverse to show newest first
-        logs = list(reversed(logs))
-
-        if not logs:
-            st.info("No activity logs found" if not is_arabic else "لم يتم العثور على سجلات نشاط")
-        else:
-            # Display as table
-            st.markdown(f"**Showing {len(logs)} entries**" if not is_arabic else f"**عرض {len(logs)} إدخال**")
-
-            for log in logs:
-                timestamp = log['timestamp'][:19].replace('T', ' ')
-                action_emoji = {
-                    'login': '🔓',
-                    'logout': '🔒',
-                    'save_file': '💾',
-                    'generate_pdf': '📄',
-                    'generate_preview': '👁️',
-                    'factory_reset': '🔄',
-                    'create_user': '➕',
-                    'upload_chart': '📊',
-                    'deactivate_user': '🔒',
-                    'activate_user': '🔓',
-                    'reset_password': '🔑',
-                    'change_password': '🔑'
-                }.get(log['action'], '📝')
-
-                with st.expander(
-                    f"{action_emoji} {timestamp} | {log['username']} | {log['action']}",
-                    expanded=False
-                ):
-                    st.json(log['details'])
\ No newline at end of file
+        render_activity_log_tab(is_arabic, usernames)
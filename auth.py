@@ -0,0 +1,491 @@
+"""
+Authentication and audit logging for ECES Barometer
+User accounts in users.json (bcrypt hashes) and the JSONL activity log
+"""
+
+import atexit
+import copy
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import bcrypt
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, List
+
+
+# ============================================
+# AUTHENTICATION
+# ============================================
+
+# (whole seconds since the epoch, its "YYYY-MM-DDTHH:MM:SS" text)
+_utc_second = (None, "")
+
+def _utc_now_iso() -> str:
+    """Current UTC time as '2024-01-31T12:34:56.789012Z'
+
+    The date/time text is formatted once per second and reused; only the
+    microseconds are filled in per call.
+    """
+    global _utc_second
+    secs, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    if _utc_second[0] != secs:
+        _utc_second = (secs, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(secs)))
+    return f"{_utc_second[1]}.{micros:06d}Z"
+
+class LoginThrottled(Exception):
+    """Raised by AuthManager.authenticate while a client is throttled on an account"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many failed attempts; retry in {retry_after} s")
+        self.retry_after = retry_after  # whole seconds until the next check runs
+
+class AuthManager:
+    """Handles user authentication and management"""
+
+    # bcrypt cost factor for new hashes (each +1 doubles the time per hash),
+    # clamped to the 4..31 range gensalt() accepts
+    BCRYPT_ROUNDS = min(max(int(os.environ.get("BCRYPT_ROUNDS", "10")), 4), 31)
+    # Recently rejected (username, password digest) pairs are refused
+    # without another bcrypt check for this many seconds
+    FAILED_LOGIN_TTL = 60
+    FAILED_LOGIN_CACHE_SIZE = 1024
+    # A client with this many failed checks on an account inside
+    # FAILED_LOGIN_TTL gets no further attempts on it without bcrypt (raising
+    # LoginThrottled) until the oldest one ages out; other clients are not
+    # affected, so guessing cannot lock the owner out
+    FAILED_LOGIN_LIMIT = 10
+    # last_login is only rewritten once it is at least this many seconds old
+    LAST_LOGIN_RESOLUTION = 3600
+
+    def __init__(self, auth_dir: str):
+        self.auth_dir = Path(auth_dir)
+        self.users_file = self.auth_dir / "users.json"
+        # Parsed users.json and the (mtime_ns, size) it was parsed at
+        self._cache = None
+        self._cache_stamp = None
+        # Serializes load-modify-save cycles across sessions (one instance per process)
+        self._lock = threading.RLock()
+        # (username, password digest) -> monotonic time of the failed check
+        self._failed_logins = OrderedDict()
+        # (client, username) -> monotonic times of its recent failed checks
+        # (existing accounts only; least recently failed pairs are dropped
+        # past FAILED_LOGIN_CACHE_SIZE)
+        self._recent_failures = OrderedDict()
+        self._ensure_auth_dir()
+
+    def _ensure_auth_dir(self):
+        """Create auth directory and bootstrap admin user if needed"""
+        self.auth_dir.mkdir(exist_ok=True)
+
+        if not self.users_file.exists():
+            # Bootstrap initial admin
+            initial_data = {
+                "version": "1.0",
+                "users": {
+                    "admin": {
+                        "username": "admin",
+                        "password_hash": self._hash_password("admin123"),
+                        "role": "admin",
+                        "created_at": _utc_now_iso(),
+                        "created_by": "system",
+                        "last_login": None,
+                        "is_active": True
+                    }
+                }
+            }
+            self._save_users(initial_data, pretty=True)
+
+    def _hash_password(self, password: str) -> str:
+        """Hash password using bcrypt"""
+        return bcrypt.hashpw(password.encode('utf-8'),
+                            bcrypt.gensalt(rounds=self.BCRYPT_ROUNDS)).decode('utf-8')
+
+    def _verify_password(self, password: str, password_hash: str) -> bool:
+        """Verify password against hash"""
+        return bcrypt.checkpw(password.encode('utf-8'),
+                             password_hash.encode('utf-8'))
+
+    def _needs_rehash(self, password_hash: str) -> bool:
+        """True if a stored hash was made with a lower cost than BCRYPT_ROUNDS"""
+        # Never downgrade: the baseline's cost-12 hashes stay as they are
+        # when BCRYPT_ROUNDS is set lower
+        try:
+            return int(password_hash.split("$")[2]) < self.BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return False
+
+    def _file_stamp(self) -> tuple:
+        """(mtime_ns, size) of users.json, used to invalidate the parsed copy"""
+        stat = self.users_file.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_users(self, writable: bool = True) -> Dict:
+        """Load users from JSON file (re-parsed only when the file changed)
+
+        With writable=False the shared parsed copy itself is returned; the
+        caller must only read it.
+        """
+        stamp = self._file_stamp()
+        if stamp != self._cache_stamp:
+            with open(self.users_file, 'r', encoding='utf-8') as f:
+                self._cache = json.load(f)
+            self._cache_stamp = stamp
+        if not writable:
+            return self._cache
+        # Callers modify what they get back before saving it
+        return copy.deepcopy(self._cache)
+
+    def _save_users(self, data: Dict, pretty: bool = False):
+        """Save users to JSON file (atomically: readers never see a partial file)
+
+        Login bookkeeping writes compact JSON; admin edits pass pretty=True
+        so the file stays readable after account changes. `data` becomes
+        the cached copy, so callers must not modify it afterwards.
+        """
+        tmp_file = self.users_file.with_name(self.users_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            if pretty:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            else:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        # The rename keeps mtime and size, so the temp file's stamp is the
+        # saved file's; adopting `data` as the cache skips re-parsing it
+        stat = tmp_file.stat()
+        os.replace(tmp_file, self.users_file)
+        self._cache = data
+        self._cache_stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def _forget_failed_logins(self, username: str):
+        """Drop cached failures for a user whose password or status changed"""
+        with self._lock:
+            for key in [k for k in self._failed_logins if k[0] == username]:
+                del self._failed_logins[key]
+            for key in [k for k in self._recent_failures if k[1] == username]:
+                del self._recent_failures[key]
+
+    def authenticate(self, username: str, password: str, client: str = "") -> Optional[Dict]:
+        """Authenticate user and return user data if successful
+
+        Raises LoginThrottled instead of checking the password while this
+        client (e.g. its IP address) has FAILED_LOGIN_LIMIT recent failures
+        on the account. Repeats answered from the failed-login cache are not
+        counted as new failures.
+        """
+        attempt = (username, hashlib.blake2b(password.encode('utf-8'), digest_size=16).digest())
+        now = time.monotonic()
+        with self._lock:
+            failed_at = self._failed_logins.get(attempt)
+        if failed_at is not None and now - failed_at < self.FAILED_LOGIN_TTL:
+            return None  # same wrong password again: skip the bcrypt check
+
+        users_data = self._load_users(writable=False)
+        user = users_data["users"].get(username)
+
+        if not (user and user["is_active"]):
+            return None
+        throttle_key = (client, username)
+        with self._lock:
+            failures = self._recent_failures.get(throttle_key)
+            while failures and now - failures[0] >= self.FAILED_LOGIN_TTL:
+                failures.popleft()
+            if failures and len(failures) >= self.FAILED_LOGIN_LIMIT:
+                # Password guessing on this account: skip bcrypt, but say so
+                # rather than reporting the password as wrong
+                remaining = self.FAILED_LOGIN_TTL - (now - failures[0])
+                raise LoginThrottled(max(1, int(remaining + 0.999)))
+        if not self._verify_password(password, user["password_hash"]):
+            with self._lock:
+                self._recent_failures.setdefault(throttle_key, deque()).append(now)
+                self._recent_failures.move_to_end(throttle_key)
+                if len(self._recent_failures) > self.FAILED_LOGIN_CACHE_SIZE:
+                    self._recent_failures.popitem(last=False)
+                self._failed_logins[attempt] = now
+                self._failed_logins.move_to_end(attempt)
+                if len(self._failed_logins) > self.FAILED_LOGIN_CACHE_SIZE:
+                    self._failed_logins.popitem(last=False)
+            return None
+
+        # Hashes from a weaker cost setting are upgraded in place while the
+        # plaintext is at hand
+        new_hash = None
+        if self._needs_rehash(user["password_hash"]):
+            new_hash = self._hash_password(password)
+
+        # Update last login (the slow bcrypt work above stays outside the lock);
+        # a recent timestamp is left alone so most logins skip the rewrite
+        now_utc = datetime.utcnow()
+        if not new_hash and self._login_is_recent(user.get("last_login"), now_utc):
+            return dict(user)
+        with self._lock:
+            users_data = self._load_users()
+            user = users_data["users"][username]
+            user["last_login"] = now_utc.isoformat() + "Z"
+            if new_hash:
+                user["password_hash"] = new_hash
+            self._save_users(users_data)
+        return dict(user)  # `user` now lives in the shared cache
+
+    def _login_is_recent(self, last_login: Optional[str], now_utc: datetime) -> bool:
+        """True if last_login is within LAST_LOGIN_RESOLUTION of now_utc"""
+        if not last_login:
+            return False
+        try:
+            elapsed = now_utc - datetime.fromisoformat(last_login.rstrip("Z"))
+        except ValueError:
+            return False
+        return 0 <= elapsed.total_seconds() < self.LAST_LOGIN_RESOLUTION
+
+    def create_user(self, username: str, password: str, role: str,
+                   created_by: str) -> tuple:
+        """Create new user (admin only)"""
+        with self._lock:
+            users_data = self._load_users()
+
+            if username in users_data["users"]:
+                return False, "Username already exists"
+
+            if role not in ["admin", "user"]:
+                return False, "Invalid role"
+
+            users_data["users"][username] = {
+                "username": username,
+                "password_hash": self._hash_password(password),
+                "role": role,
+                "created_at": _utc_now_iso(),
+                "created_by": created_by,
+                "last_login": None,
+                "is_active": True
+            }
+            self._save_users(users_data, pretty=True)
+            return True, "User created successfully"
+
+    def get_all_users(self) -> List[Dict]:
+        """Get list of all users (for admin panel)"""
+        # User records are flat, so a shallow copy each is enough to keep
+        # callers from touching the cache (cheaper than a deepcopy per rerun)
+        users_data = self._load_users(writable=False)
+        return [dict(user) for user in users_data["users"].values()]
+
+    def update_user_status(self, username: str, is_active: bool) -> tuple:
+        """Enable/disable user account"""
+        with self._lock:
+            users_data = self._load_users()
+            if username not in users_data["users"]:
+                return False, "User not found"
+
+            users_data["users"][username]["is_active"] = is_active
+            self._save_users(users_data, pretty=True)
+            self._forget_failed_logins(username)
+            return True, f"User {'activated' if is_active else 'deactivated'}"
+
+    def change_password(self, username: str, new_password: str) -> tuple:
+        """Change user password"""
+        with self._lock:
+            users_data = self._load_users()
+            if username not in users_data["users"]:
+                return False, "User not found"
+
+            users_data["users"][username]["password_hash"] = self._hash_password(new_password)
+            self._save_users(users_data, pretty=True)
+            self._forget_failed_logins(username)
+            return True, "Password changed successfully"
+
+
+# ============================================
+# AUDIT LOG
+# ============================================
+
+class AuditLogger:
+    """Handles activity logging"""
+
+    # Block size for reading the log backwards from the end
+    TAIL_BLOCK_SIZE = 64 * 1024
+
+    # Queued entries reach the file at most this many seconds after logging,
+    # or as soon as this many are waiting
+    FLUSH_INTERVAL = 0.5
+    FLUSH_BATCH = 64
+
+    # Past this size the live log is gzipped into a dated segment
+    # (audit_log.<utc time>.jsonl.gz) and a fresh file is started
+    ROTATE_BYTES = 16 * 1024 * 1024
+
+    # Reused encoder: json.dumps(..., ensure_ascii=False) builds a new one per call
+    _encode = json.JSONEncoder(ensure_ascii=False).encode
+
+    def __init__(self, auth_dir: str):
+        self.log_file = Path(auth_dir) / "audit_log.jsonl"
+        # log() only queues the line; one writer thread owns the append handle
+        # and writes whole batches, so callers never wait on the disk
+        self._queue = queue.Queue()
+        self._fh = open(self.log_file, 'a', encoding='utf-8', buffering=65536)
+        # (file stamp, limit, entries) of the last get_recent_logs() result
+        self._tail_cache = None
+        threading.Thread(target=self._writer, name="audit-log-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _format(self, timestamp: str, username: str, action: str, details: Optional[Dict]) -> str:
+        """One JSONL entry"""
+        # Fixed schema, so the line is assembled directly; only the values
+        # go through the encoder (same output as json.dumps of the entry dict)
+        return (
+            f'{{"timestamp": "{timestamp}", '
+            f'"username": {self._encode(username)}, '
+            f'"action": {self._encode(action)}, '
+            f'"details": {self._encode(details or {})}}}\n'
+        )
+
+    def log(self, username: str, action: str, details: Dict = None):
+        """Append log entry"""
+        self._queue.put_nowait(self._format(_utc_now_iso(), username, action, details))
+
+    def log_many(self, entries: List[tuple]):
+        """Append several (username, action, details) entries of one action as one queue item"""
+        timestamp = _utc_now_iso()
+        lines = "".join(self._format(timestamp, *entry) for entry in entries)
+        if lines:
+            self._queue.put_nowait(lines)
+
+    def _writer(self):
+        """Drain the queue: one write() and flush() per batch of entries"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            # A flush() request (an Event) ends the batch early
+            while len(batch) < self.FLUSH_BATCH and not isinstance(batch[-1], threading.Event):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                if self._fh.closed:
+                    # A rotation could not reopen the live log; retry here
+                    self._fh = open(self.log_file, 'a', encoding='utf-8', buffering=65536)
+                self._fh.write("".join(item for item in batch if isinstance(item, str)))
+                self._fh.flush()
+                if self._fh.tell() >= self.ROTATE_BYTES:
+                    self._rotate()
+            except Exception:
+                pass  # e.g. disk full: drop this batch but keep the writer alive
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _rotate(self):
+        """Move the live log aside, reopen it empty, then gzip the old one"""
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        rotating = self.log_file.with_name(f"audit_log.{stamp}.jsonl")
+
+        self._fh.close()
+        try:
+            os.replace(self.log_file, rotating)
+        finally:
+            # Reopen even if the rename failed, so later batches still land
+            self._fh = open(self.log_file, 'a', encoding='utf-8', buffering=65536)
+
+        # Also picks up segments an earlier rotation failed to compress
+        for plain in self.log_file.parent.glob("audit_log.*.jsonl"):
+            self._compress(plain)
+
+    def _compress(self, plain: Path):
+        """Replace a rotated plain segment with its .gz"""
+        segment = plain.with_name(plain.name + ".gz")
+        tmp_segment = segment.with_name(segment.name + ".tmp")
+        try:
+            with open(plain, 'rb') as src, gzip.open(tmp_segment, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.TAIL_BLOCK_SIZE)
+            os.replace(tmp_segment, segment)
+        except BaseException:
+            tmp_segment.unlink(missing_ok=True)
+            raise
+        os.unlink(plain)
+
+    def _segments(self) -> List[Path]:
+        """Rotated segments, newest first: .gz, or plain where compression failed"""
+        segments = {}
+        for path in self.log_file.parent.glob("audit_log.*.jsonl*"):
+            stamp, ext = path.name[len("audit_log."):].split(".", 1)
+            # A plain file next to its .gz only lost its unlink; read the .gz
+            if ext == "jsonl.gz" or (ext == "jsonl" and stamp not in segments):
+                segments[stamp] = path
+        return [segments[stamp] for stamp in sorted(segments, reverse=True)]
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until every entry logged so far is in the log file"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def get_recent_logs(self, limit: int = 100) -> List[Dict]:
+        """Get recent log entries (for admin panel)
+
+        Re-read only when the log file changed since the last call with the
+        same limit; the returned entries are shared and must not be modified.
+        """
+        self.flush()
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            return []
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._tail_cache
+        if cached is not None and cached[0] == stamp and cached[1] == limit:
+            return list(cached[2])
+        entries = self._read_tail(limit)
+        self._tail_cache = (stamp, limit, entries)
+        return list(entries)
+
+    def _read_tail(self, limit: int) -> List[Dict]:
+        """Parse the last `limit` entries, reaching into rotated segments if needed"""
+        # Read blocks backwards from EOF until they hold more than `limit`
+        # newlines, so memory and I/O do not grow with the log
+        chunks = []
+        newlines = 0
+        try:
+            f = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            pos = f.seek(0, os.SEEK_END)
+            while pos > 0 and newlines <= limit:
+                step = min(self.TAIL_BLOCK_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                chunks.append(chunk)
+                newlines += chunk.count(b'\n')
+
+        lines = b''.join(reversed(chunks)).split(b'\n')
+        if pos > 0:
+            lines = lines[1:]  # may start mid-line
+        if lines and not lines[-1]:
+            lines.pop()  # after the final newline
+
+        if len(lines) < limit:
+            # Recently rotated: continue into the rotated segments, newest first
+            for segment in self._segments():
+                opener = gzip.open if segment.suffix == ".gz" else open
+                with opener(segment, 'rb') as f:
+                    lines = f.read().splitlines() + lines
+                if len(lines) >= limit:
+                    break
+
+        # Get last N lines, decoded as one JSON array (a single C-level parse
+        # instead of one json.loads call per line)
+        recent_lines = [line for line in lines[-limit:] if line.strip()]
+        try:
+            return json.loads(b'[' + b','.join(recent_lines) + b']')
+        except ValueError:
+            # A torn or hand-edited line: fall back to per-line decoding
+            return [json.loads(line) for line in recent_lines]
@@ -624,6 +624,10 @@ def get_block_name(block_type: BlockType) -> str:
 # LATEX PARSER (LaTeX -> Blocks)
 # ============================================
 
+# "% BLOCK:TYPE key=value ..." marker, matched against a stripped line
+BLOCK_MARKER_PATTERN = re.compile(r'%\s*BLOCK:(\w+)(?:\s+(.+?))?$')
+
+
 class LaTeXParser:
     """Parse LaTeX content into blocks"""
 
@@ -672,8 +676,11 @@ class LaTeXParser:
         """Parse content using % BLOCK:TYPE markers"""
         blocks = []
 
+        # Unmarked files (e.g. static sections) skip the line scan entirely
+        if 'BLOCK:' not in latex_content:
+            return blocks
+
         # Find all block markers
-        marker_pattern = r'%\s*BLOCK:(\w+)(?:\s+(.+?))?$'
         lines = latex_content.split('\n')
 
         current_block_type = None
@@ -682,7 +689,9 @@ class LaTeXParser:
         current_position = 0
 
         for i, line in enumerate(lines):
-            match = re.match(marker_pattern, line.strip())
+            stripped = line.strip()
+            # Only comment lines can be markers; skip the regex for the rest
+            match = BLOCK_MARKER_PATTERN.match(stripped) if stripped.startswith('%') else None
 
             if match:
                 # Save previous block if exists
@@ -704,7 +713,7 @@ class LaTeXParser:
 
             elif current_block_type:
                 # Skip certain markers
-                if line.strip().startswith('% BLOCK:END'):
+                if stripped.startswith('% BLOCK:END'):
                     if current_content_lines:
                         block = self._create_block_from_marker(
                             current_block_type,
@@ -716,7 +725,7 @@ class LaTeXParser:
                             blocks.append(block)
                     current_block_type = None
                     current_content_lines = []
-                elif not line.strip().startswith('% ========='):
+                elif not stripped.startswith('% ========='):
                     current_content_lines.append(line)
 
         # Save last block
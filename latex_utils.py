@@ -0,0 +1,174 @@
+"""
+LaTeX text helpers for ECES Barometer
+Legacy editor block splitting and build log parsing
+"""
+
+import os
+import re
+
+
+# ============================================
+# LEGACY EDITOR BLOCKS
+# ============================================
+
+# A "code" line is blank or starts (after indentation) with \ % { or };
+# one match is a whole run of consecutive code lines (without its last newline)
+_CODE_RUN_RE = re.compile(r'^(?:[^\S\n]*(?:[\\%{}].*)?\n)*[^\S\n]*(?:[\\%{}].*)?$', re.MULTILINE)
+
+def parse_latex_blocks(content):
+    """
+    Split content into alternating 'code' and 'text' blocks.
+
+    One multiline regex scan (_CODE_RUN_RE) yields each run of code lines,
+    so Python only loops once per block; the text blocks are the gaps
+    between runs. Blocks are sliced straight out of the content string.
+    """
+    if not content:
+        return []
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    if content.endswith('\n'):
+        content = content[:-1]  # match str.splitlines(): no trailing empty line
+
+    blocks = []
+    pos = 0  # offset of the first line not yet in a block
+
+    for m in _CODE_RUN_RE.finditer(content):
+        start, end = m.span()
+        if start < pos:
+            continue  # empty match on the blank line that ended the previous run
+        if start > pos:
+            # Lines between the previous run and this one are text
+            blocks.append({'type': 'text', 'content': content[pos:start - 1]})
+        blocks.append({'type': 'code', 'content': content[start:end]})
+        pos = end + 1
+
+    if pos <= len(content):
+        # Trailing text lines after the last code run
+        blocks.append({'type': 'text', 'content': content[pos:]})
+    return blocks
+
+def reconstruct_latex(blocks):
+    """Inverse of parse_latex_blocks: one str.join sizes and copies the output once"""
+    return "\n".join([b['content'] for b in blocks])
+
+
+# ============================================
+# BUILD LOG PARSING
+# ============================================
+
+# Every line parse_latex_log reacts to starts with "!" or contains one of
+# these (compared in lowercase)
+_LOG_NEEDLES = (b"not found", b"undefined", b"overfull", b"underfull", b"latex error: file")
+
+def _log_candidate_lines(data):
+    """
+    Sorted start offsets of the log lines that parse_latex_log must inspect.
+
+    bytes.find runs in C over the whole buffer, so the many ordinary lines
+    of a log never reach Python code. lower() maps byte to byte, so offsets
+    in the lowered copy are offsets in data.
+    """
+    lowered = data.lower()
+    starts = {0} if data.startswith(b"!") else set()
+    i = data.find(b"\n!")
+    while i != -1:
+        starts.add(i + 1)
+        i = data.find(b"\n!", i + 1)
+    for needle in _LOG_NEEDLES:
+        i = lowered.find(needle)
+        while i != -1:
+            starts.add(data.rfind(b"\n", 0, i) + 1)
+            i = lowered.find(needle, i + 1)
+    return sorted(starts)
+
+def _skip_lines(data, pos, count):
+    """Offset just past the `count` lines starting at pos (or the end of data)"""
+    for _ in range(count):
+        pos = data.find(b"\n", pos) + 1
+        if not pos:
+            return len(data)
+    return pos
+
+def parse_latex_log(log_path):
+    """Parse LaTeX log file for detailed error information"""
+    if not os.path.exists(log_path):
+        return "Log file not found."
+
+    errors = []
+    warnings = []
+    # A broken build can log hundreds of errors (TeX gives up at 100 per
+    # pass); the first few are what the user needs, so only those are kept
+    max_errors = 20
+    more_errors = 0
+
+    try:
+        # Kept as bytes: only the candidate lines are decoded (latin-1 maps
+        # every byte, so offsets and text match a decoded read)
+        with open(log_path, "rb") as f:
+            data = f.read()
+        if b"\r" in data:
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")  # as text mode reads it
+
+        # Only candidate lines are visited; `pos` is where the lines not yet
+        # handled (or swallowed as error context) start
+        pos = 0
+        for line_start in _log_candidate_lines(data):
+            if line_start < pos:
+                continue
+            pos = data.find(b"\n", line_start) + 1 or len(data)
+            line = data[line_start:pos].decode("latin-1")
+
+            # Critical errors starting with !
+            if line.startswith("!"):
+                pos = _skip_lines(data, pos, 4)  # Get more context
+                if len(errors) < max_errors:
+                    error_block = data[line_start:pos].decode("latin-1").strip()
+                    errors.append(f"❌ ERROR:\n{error_block}")
+                else:
+                    more_errors += 1
+                continue
+
+            # Missing file errors
+            if "File" in line and "not found" in line:
+                errors.append(f"📁 MISSING FILE:\n{line.strip()}")
+
+            # Font errors
+            if "Font" in line and ("not found" in line or "undefined" in line.lower()):
+                errors.append(f"🔤 FONT ERROR:\n{line.strip()}")
+
+            # Undefined control sequence
+            if "Undefined control sequence" in line:
+                pos = _skip_lines(data, pos, 2)
+                if len(errors) < max_errors:
+                    errors.append(f"⚠️ UNDEFINED COMMAND:\n{data[line_start:pos].decode('latin-1').strip()}")
+                else:
+                    more_errors += 1
+                continue
+
+            # Missing package
+            if "LaTeX Error: File" in line and ".sty" in line:
+                errors.append(f"📦 MISSING PACKAGE:\n{line.strip()}")
+
+            # Overfull/underfull boxes (warnings); only shown when there are
+            # at most 10, so there is no point keeping more than 11
+            if ("Overfull" in line or "Underfull" in line) and len(warnings) <= 10:
+                warnings.append(line.strip())
+
+        # Build result
+        result_parts = []
+
+        if errors:
+            if more_errors:
+                errors.append(f"... and {more_errors} more")
+            result_parts.append("=== ERRORS ===\n" + "\n\n".join(errors))
+
+        if warnings and len(warnings) <= 10:  # Only show if not too many
+            result_parts.append("=== WARNINGS ===\n" + "\n".join(warnings[:5]))
+
+        if result_parts:
+            return "\n\n".join(result_parts)
+        else:
+            return "Unknown error. Check LaTeX syntax and file paths."
+
+    except Exception as e:
+        return f"Could not parse log: {str(e)}"
@@ -0,0 +1,162 @@
+"""
+Tests for auth: password hashing, login throttling and the audit log
+"""
+
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import bcrypt
+
+# Cheap hashes for the accounts these tests create
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from auth import AuthManager, AuditLogger, LoginThrottled  # noqa: E402
+
+
+def make_hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+class NeedsRehashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.auth = AuthManager(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lower_cost_is_upgraded(self):
+        with mock.patch.object(AuthManager, "BCRYPT_ROUNDS", 10):
+            self.assertTrue(self.auth._needs_rehash(make_hash("pw", 4)))
+
+    def test_same_or_higher_cost_is_kept(self):
+        with mock.patch.object(AuthManager, "BCRYPT_ROUNDS", 6):
+            self.assertFalse(self.auth._needs_rehash(make_hash("pw", 6)))
+            self.assertFalse(self.auth._needs_rehash(make_hash("pw", 8)))
+
+    def test_malformed_hash(self):
+        self.assertFalse(self.auth._needs_rehash("not-a-bcrypt-hash"))
+        self.assertFalse(self.auth._needs_rehash("$2b$xx$abc"))
+
+    def test_login_upgrades_weak_hash(self):
+        with mock.patch.object(AuthManager, "BCRYPT_ROUNDS", 5):
+            self.assertTrue(self.auth.authenticate("admin", "admin123"))
+            stored = self.auth._load_users()["users"]["admin"]["password_hash"]
+            self.assertEqual(stored.split("$")[2], "05")
+            self.assertTrue(self.auth.authenticate("admin", "admin123"))
+
+
+class LoginThrottleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.auth = AuthManager(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fail_logins(self, client, count):
+        for i in range(count):
+            self.assertIsNone(self.auth.authenticate("admin", f"wrong{i}", client))
+
+    def test_repeated_wrong_password_is_not_counted(self):
+        for _ in range(AuthManager.FAILED_LOGIN_LIMIT + 5):
+            self.assertIsNone(self.auth.authenticate("admin", "same-wrong", "c1"))
+        self.assertTrue(self.auth.authenticate("admin", "admin123", "c1"))
+
+    def test_throttled_client_is_told_so(self):
+        self.fail_logins("c1", AuthManager.FAILED_LOGIN_LIMIT)
+        with self.assertRaises(LoginThrottled) as cm:
+            self.auth.authenticate("admin", "admin123", "c1")
+        self.assertGreaterEqual(cm.exception.retry_after, 1)
+        self.assertLessEqual(cm.exception.retry_after, AuthManager.FAILED_LOGIN_TTL)
+
+    def test_other_clients_can_still_log_in(self):
+        self.fail_logins("attacker", AuthManager.FAILED_LOGIN_LIMIT)
+        self.assertTrue(self.auth.authenticate("admin", "admin123", "owner"))
+
+    def test_window_expires(self):
+        self.fail_logins("c1", AuthManager.FAILED_LOGIN_LIMIT)
+        with mock.patch.object(AuthManager, "FAILED_LOGIN_TTL", 0):
+            self.assertTrue(self.auth.authenticate("admin", "admin123", "c1"))
+
+
+class AuditLoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logger = AuditLogger(self.tmp.name)
+        self.logger.ROTATE_BYTES = 2000
+
+    def tearDown(self):
+        self.logger.flush()
+        self.tmp.cleanup()
+
+    def log_range(self, start, stop):
+        for i in range(start, stop):
+            self.logger.log("user", "action", {"i": i})
+            self.logger.flush()  # one batch per entry, so rotation is checked each time
+
+    def files(self, suffix):
+        return sorted(name for name in os.listdir(self.tmp.name) if name.endswith(suffix))
+
+    def recent_ids(self, limit):
+        return [entry["details"]["i"] for entry in self.logger.get_recent_logs(limit)]
+
+    def test_entry_format(self):
+        self.logger.log("ali", "login", {"success": True, "note": "مرحبا"})
+        entry, = self.logger.get_recent_logs(10)
+        self.assertEqual(entry["username"], "ali")
+        self.assertEqual(entry["action"], "login")
+        self.assertEqual(entry["details"], {"success": True, "note": "مرحبا"})
+        self.assertRegex(entry["timestamp"], r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}Z$")
+
+    def test_log_many_shares_one_timestamp(self):
+        self.logger.log_many([("u", "factory_reset", {"file": "a"}), ("u", "factory_reset", {"file": "b"})])
+        entries = self.logger.get_recent_logs(10)
+        self.assertEqual([e["details"]["file"] for e in entries], ["a", "b"])
+        self.assertEqual(entries[0]["timestamp"], entries[1]["timestamp"])
+
+    def test_tail_without_rotation(self):
+        self.logger.ROTATE_BYTES = 1 << 30
+        self.log_range(0, 50)
+        self.assertEqual(self.recent_ids(10), list(range(40, 50)))
+        self.assertEqual(self.recent_ids(100), list(range(50)))
+
+    def test_rotation_compresses_segments(self):
+        self.log_range(0, 100)
+        segments = self.files(".jsonl.gz")
+        self.assertTrue(segments)
+        self.assertEqual(self.files(".jsonl"), ["audit_log.jsonl"])
+        with gzip.open(os.path.join(self.tmp.name, segments[0]), "rb") as f:
+            self.assertIn(b'"i": 0}', f.readline())
+
+    def test_tail_reaches_into_segments(self):
+        self.log_range(0, 100)
+        self.assertEqual(self.recent_ids(100), list(range(100)))
+        self.assertEqual(self.recent_ids(5), list(range(95, 100)))
+
+    def test_failed_compression_is_read_and_retried(self):
+        with mock.patch("auth.gzip.open", side_effect=OSError("disk full")):
+            self.log_range(0, 60)
+        self.assertGreater(len(self.files(".jsonl")), 1)  # plain segments left behind
+        self.assertFalse(self.files(".tmp"))
+        self.assertEqual(self.recent_ids(60), list(range(60)))
+
+        self.log_range(60, 100)
+        self.assertEqual(self.files(".jsonl"), ["audit_log.jsonl"])
+        self.assertEqual(self.recent_ids(100), list(range(100)))
+
+    def test_writer_survives_failed_rename(self):
+        with mock.patch("auth.os.replace", side_effect=OSError("busy")):
+            self.log_range(0, 40)
+        self.log_range(40, 80)
+        self.assertEqual(self.recent_ids(80), list(range(80)))
+
+
+if __name__ == "__main__":
+    unittest.main()
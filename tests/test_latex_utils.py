@@ -0,0 +1,163 @@
+"""
+Tests for latex_utils: legacy editor block splitting and build log parsing
+"""
+
+import glob
+import os
+import re
+import tempfile
+import unittest
+
+from latex_utils import parse_latex_blocks, reconstruct_latex, parse_latex_log
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reference_blocks(content):
+    """The original line-by-line splitter that parse_latex_blocks replaced"""
+    blocks = []
+    current_chunk = []
+    current_type = None
+    latex_cmd_pattern = re.compile(r'^(\\|\%|\{|}|\s*\\)')
+    for line in content.splitlines():
+        is_code = bool(latex_cmd_pattern.match(line.strip())) or line.strip() == ""
+        line_type = 'code' if is_code else 'text'
+        if current_type is None:
+            current_type = line_type
+        if line_type != current_type:
+            blocks.append({'type': current_type, 'content': "\n".join(current_chunk)})
+            current_chunk = [line]
+            current_type = line_type
+        else:
+            current_chunk.append(line)
+    if current_chunk:
+        blocks.append({'type': current_type, 'content': "\n".join(current_chunk)})
+    return blocks
+
+
+class ParseLatexBlocksTest(unittest.TestCase):
+
+    SAMPLES = [
+        "",
+        "Plain text only",
+        "\\section{Intro}",
+        "\\section{Intro}\nSome text.\nMore text.\n\\end{itemize}",
+        "Text first\n\n% comment\n{\n}\nText again\n",
+        "  \\indented{command}\n\ttext with a tab\n   \n\\last",
+        "\n\n\nText after blank lines\n\n",
+        "a\nb\n\\c\nd",
+    ]
+
+    def test_matches_original_splitter(self):
+        for content in self.SAMPLES:
+            with self.subTest(content=content):
+                self.assertEqual(parse_latex_blocks(content), reference_blocks(content))
+
+    def test_blocks_alternate(self):
+        for content in self.SAMPLES:
+            types = [b['type'] for b in parse_latex_blocks(content)]
+            self.assertTrue(all(a != b for a, b in zip(types, types[1:])), types)
+
+    def test_round_trip(self):
+        for content in self.SAMPLES:
+            with self.subTest(content=content):
+                # A final newline is dropped, as str.splitlines() does
+                expected = content[:-1] if content.endswith("\n") else content
+                self.assertEqual(reconstruct_latex(parse_latex_blocks(content)), expected)
+
+    def test_crlf_is_normalized(self):
+        self.assertEqual(parse_latex_blocks("\\a\r\ntext\r\n"), parse_latex_blocks("\\a\ntext\n"))
+
+    def test_section_files_round_trip(self):
+        paths = sorted(glob.glob(os.path.join(REPO_DIR, "content", "*.tex"))
+                       + glob.glob(os.path.join(REPO_DIR, "static_sections", "*.tex")))
+        self.assertTrue(paths)
+        for path in paths:
+            with self.subTest(path=os.path.basename(path)):
+                with open(path, encoding="utf-8") as f:
+                    content = f.read()
+                blocks = parse_latex_blocks(content)
+                self.assertEqual(blocks, reference_blocks(content))
+                self.assertEqual(reconstruct_latex(blocks), content[:-1] if content.endswith("\n") else content)
+
+
+class ParseLatexLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp.name, "main.log")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self, text, newline="\n"):
+        with open(self.log_path, "w", encoding="latin-1", newline=newline) as f:
+            f.write(text)
+        return parse_latex_log(self.log_path)
+
+    def test_missing_log(self):
+        self.assertEqual(parse_latex_log(self.log_path), "Log file not found.")
+
+    def test_clean_log(self):
+        self.assertEqual(self.parse("This is XeTeX\nOutput written on main.pdf\n"),
+                         "Unknown error. Check LaTeX syntax and file paths.")
+
+    def test_error_with_context(self):
+        # The "!" line and the four lines after it
+        result = self.parse("ok\n! Undefined control sequence.\nl.12 \\foo\n  bar\nbaz\nqux\nafter\n")
+        self.assertIn("=== ERRORS ===", result)
+        self.assertIn("❌ ERROR:\n! Undefined control sequence.\nl.12 \\foo\n  bar\nbaz\nqux", result)
+        self.assertNotIn("after", result)
+
+    def test_error_at_start_of_log(self):
+        self.assertIn("❌ ERROR:\n! Emergency stop.", self.parse("! Emergency stop.\n"))
+
+    def test_undefined_command(self):
+        result = self.parse("l.3 Undefined control sequence here\nnext line\nlast\n")
+        self.assertIn("⚠️ UNDEFINED COMMAND:\nl.3 Undefined control sequence here\nnext line", result)
+
+    def test_missing_file_and_package(self):
+        result = self.parse("! LaTeX Error: File `foo.sty' not found.\n\n1\n2\n3\n"
+                            "LaTeX Warning: File `chart.png' not found on input line 4.\n")
+        self.assertIn("❌ ERROR:\n! LaTeX Error: File `foo.sty' not found.", result)
+        self.assertIn("📁 MISSING FILE:\nLaTeX Warning: File `chart.png' not found on input line 4.", result)
+
+    def test_font_error(self):
+        result = self.parse('fontspec: Font "Amiri" not found.\n')
+        self.assertIn('🔤 FONT ERROR:\nfontspec: Font "Amiri" not found.', result)
+
+    def test_package_error_needs_sty(self):
+        result = self.parse("LaTeX Error: File `x.sty' is bad\n")
+        self.assertIn("📦 MISSING PACKAGE:\nLaTeX Error: File `x.sty' is bad", result)
+
+    def test_box_warnings(self):
+        result = self.parse("Overfull \\hbox (1.0pt too wide) in paragraph\n"
+                            "Underfull \\vbox (badness 10000) has occurred\n")
+        self.assertTrue(result.startswith("=== WARNINGS ===\n"))
+        self.assertIn("Overfull \\hbox", result)
+        self.assertIn("Underfull \\vbox", result)
+
+    def test_too_many_box_warnings_are_hidden(self):
+        result = self.parse("Overfull \\hbox (1pt too wide)\n" * 11)
+        self.assertNotIn("WARNINGS", result)
+
+    def test_errors_are_capped(self):
+        result = self.parse("".join(f"! Error {i}.\na\nb\nc\nd\n" for i in range(25)))
+        self.assertEqual(result.count("❌ ERROR:"), 20)
+        self.assertIn("... and 5 more", result)
+        self.assertIn("! Error 19.", result)
+        self.assertNotIn("! Error 20.", result)
+
+    def test_crlf_log(self):
+        result = self.parse("! Missing $ inserted.\nl.5 x\n", newline="\r\n")
+        self.assertIn("❌ ERROR:\n! Missing $ inserted.\nl.5 x", result)
+        self.assertNotIn("\r", result)
+
+    def test_non_utf8_bytes(self):
+        with open(self.log_path, "wb") as f:
+            f.write(b"! Undefined control sequence \xe9\xff.\n")
+        self.assertIn("! Undefined control sequence \xe9\xff.", parse_latex_log(self.log_path))
+
+
+if __name__ == "__main__":
+    unittest.main()